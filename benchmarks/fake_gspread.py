@@ -0,0 +1,253 @@
+"""本地替身：不需要 Google 凭证的 gspread 客户端 + 合成工作表。
+
+只实现 streamlit_app 用到的接口（open_by_key / values_batch_get / worksheet().get_all_values，
+以及训练记录写回用的 values_append / values_get / add_worksheet），表头与真实的 Google Sheet 一致。
+可注入延迟、429 限流错误和"已写入但响应丢失"，用来验证重试、请求合并与写回去重。
+通过环境变量接入 App：
+
+    FITNESS_SHEETS_CLIENT=benchmarks.fake_gspread:from_env FAKE_SHEETS_ROWS=5000 \
+    FAKE_SHEETS_LATENCY=0.5 FAKE_SHEETS_429_RATE=0.3 streamlit run streamlit_app.py
+"""
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from gspread.exceptions import APIError, WorksheetNotFound
+
+WEEKLY_HEADER = ["训练日", "阶段", "动作名称", "动作类型", "组数x次数", "节奏/要点", "目标RPE", "渐进规则", "注意事项"]
+LIBRARY_HEADER = ["动作名称", "动作类型", "目标肌群", "道长专属注意事项"]
+BODY_HEADER = ["类别", "项目", "详细说明"]
+NOTES_HEADER = ["主题", "内容"]
+TRAINING_NOTES_HEADER = ["日期", "动作名称", "问题发现", "修正建议", "优先级", "状态"]
+
+DAYS = [
+    "每日通用热身", "每日练后拉伸", "第1天：下肢+核心", "第2天：上肢拉", "第3天：轻量全身+恢复",
+    "第4天：上肢推", "第5天：后链+下肢", "第6天：灵活性+松解", "第7天：完全休息",
+]
+PHASES = ["热身激活", "主项训练", "辅助训练", "拉伸放松"]
+TYPES = ["💪 复合", "🎯 孤立", "🔧 激活", "🧘 拉伸"]
+RPES = ["7-8", "8-9", "8", "4-5", "5-6", "6-7", ""]
+MUSCLES = ["股四头肌", "臀大肌", "背阔肌", "胸大肌", "三角肌", "核心", "腘绳肌"]
+CATEGORIES = ["🔴 伤病状况", "🚫 训练禁忌", "🟡 环境因素", "🟢 恢复策略", "🔵 营养与作息", "📋 训练原则"]
+PRIORITIES = ["高", "中", "低"]
+STATUSES = ["执行中", "已修正", "观察中", "每次练前", "长期执行"]
+
+
+def synthetic_sheets(n_rows: int, seed: int = 0) -> dict:
+    """生成 {标题: 二维列表}；周训练计划、动作库、训练笔记各 n_rows 行，其余按比例缩小"""
+    rng = random.Random(seed)
+
+    weekly = [WEEKLY_HEADER]
+    per_day = max(n_rows // len(DAYS), 1)
+    for day in DAYS:
+        for k in range(per_day):
+            name = f"严禁{rng.choice(MUSCLES)}爆发动作" if rng.random() < 0.03 else f"动作{rng.randrange(n_rows)}"
+            weekly.append([
+                day if k == 0 else "",
+                PHASES[min(k * len(PHASES) // per_day, len(PHASES) - 1)],
+                name,
+                rng.choice(TYPES),
+                f"{rng.randint(2, 5)}x{rng.choice([5, 8, 10, 12, 15])}",
+                rng.choice(["2-0-2", "慢速离心", "顶峰收缩1秒", ""]),
+                rng.choice(RPES),
+                rng.choice(["每周+2.5kg", "每周+1次", ""]),
+                rng.choice(["⚠️ 膝盖不要内扣", "保持核心收紧", "", ""]),
+            ])
+
+    library = [LIBRARY_HEADER] + [
+        [f"动作{i}", rng.choice(TYPES), rng.choice(MUSCLES), rng.choice(["注意呼吸节奏", "⚠️ 避免耸肩", ""])]
+        for i in range(n_rows)
+    ]
+
+    body = [BODY_HEADER]
+    n_body = max(n_rows // 10, len(CATEGORIES))
+    for i in range(n_body):
+        category = CATEGORIES[i * len(CATEGORIES) // n_body]
+        first = i == 0 or CATEGORIES[(i - 1) * len(CATEGORIES) // n_body] != category
+        body.append([category if first else "", f"项目{i}", f"说明{i}：" + rng.choice(MUSCLES)])
+
+    notes = [NOTES_HEADER]
+    for i in range(max(n_rows // 10, 3)):
+        if i % 8 == 0:
+            notes.append([f"章节{i // 8}", ""])
+        elif i % 8 == 7:
+            notes.append(["", ""])
+        else:
+            notes.append([f"要点{i}", f"内容{i}"])
+
+    training_notes = [TRAINING_NOTES_HEADER] + [
+        [
+            f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            rng.choice([f"动作{rng.randrange(n_rows)}", "[通用]"]),
+            f"问题{i}：" + rng.choice(MUSCLES) + "代偿",
+            f"建议{i}：降低重量",
+            rng.choice(PRIORITIES),
+            rng.choice(STATUSES),
+        ]
+        for i in range(n_rows)
+    ]
+
+    return {
+        "周训练计划": weekly,
+        "动作库": library,
+        "身体状况与禁忌": body,
+        "备注与说明": notes,
+        "训练笔记": training_notes,
+    }
+
+
+def _trim(row: list) -> list:
+    # Sheets API 会裁掉行尾的空单元格
+    end = len(row)
+    while end and row[end - 1] == "":
+        end -= 1
+    return row[:end]
+
+
+def _title_from_range(a1: str) -> str:
+    sheet = a1 if a1.endswith("'") else a1.rsplit("!", 1)[0]
+    if sheet.startswith("'") and sheet.endswith("'"):
+        return sheet[1:-1].replace("''", "'")
+    return sheet
+
+
+class _FakeResponse:
+    """APIError 需要的最小 response 接口"""
+
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        self.text = message
+        self._message = message
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": self._message, "status": "RESOURCE_EXHAUSTED"}}
+
+
+def quota_error() -> APIError:
+    return APIError(_FakeResponse(429, "Quota exceeded for quota metric 'Read requests'"))
+
+
+def unavailable_error() -> APIError:
+    return APIError(_FakeResponse(503, "The service is currently unavailable."))
+
+
+class FakeWorksheet:
+    def __init__(self, client, title):
+        self._client = client
+        self.title = title
+
+    def get_all_values(self):
+        self._client.calls["get_all_values"] += 1
+        values = self._client.sheets[self.title]
+        width = max((len(r) for r in values), default=0)
+        return [r + [""] * (width - len(r)) for r in values]
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, key):
+        self._client = client
+        self.id = key
+
+    def worksheet(self, title):
+        if title not in self._client.sheets:
+            raise WorksheetNotFound(title)
+        return FakeWorksheet(self._client, title)
+
+    def add_worksheet(self, title, rows, cols, index=None):
+        self._client.calls["add_worksheet"] += 1
+        self._client.sheets.setdefault(title, [])
+        return FakeWorksheet(self._client, title)
+
+    def values_get(self, range, params=None):
+        self._client.calls["values_get"] += 1
+        self._client.simulate_request()
+        values = [_trim(r) for r in self._client.sheets[_title_from_range(range)]]
+        if range.endswith("!A:A"):
+            values = [r[:1] for r in values]
+        return {"range": range, "majorDimension": "ROWS", "values": values}
+
+    def values_append(self, range, params, body):
+        """整批追加；drop_next_response 生效时照常写入，再抛出 503（模拟响应在路上丢失）"""
+        self._client.calls["values_append"] += 1
+        self._client.simulate_request()
+        self._client.sheets[_title_from_range(range)].extend(list(r) for r in body["values"])
+        self._client.simulate_lost_response()
+        return {"spreadsheetId": self.id, "updates": {"updatedRows": len(body["values"])}}
+
+    def values_batch_get(self, ranges, params=None):
+        self._client.calls["values_batch_get"] += 1
+        self._client.simulate_request()
+        value_ranges = []
+        for a1 in ranges:
+            values = [_trim(r) for r in self._client.sheets[_title_from_range(a1)]]
+            value_ranges.append({"range": a1, "majorDimension": "ROWS", "values": values})
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+
+class FakeClient:
+    """calls 记录每种接口被调用的次数，便于断言网络往返次数。
+
+    latency：每次请求的延迟（秒）；error_rate：请求返回 429 的概率；
+    fail_next(n)：接下来 n 次请求必定返回 429；drop_next_response(n)：接下来 n 次追加写入成功但返回 503。
+    """
+
+    def __init__(self, sheets: dict, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.sheets = sheets
+        self.calls = Counter()
+        self.latency = latency
+        self.error_rate = error_rate
+        self._forced_errors = 0
+        self._lost_responses = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def open_by_key(self, key):
+        self.calls["open_by_key"] += 1
+        return FakeSpreadsheet(self, key)
+
+    def fail_next(self, n: int = 1):
+        with self._lock:
+            self._forced_errors += n
+
+    def drop_next_response(self, n: int = 1):
+        with self._lock:
+            self._lost_responses += n
+
+    def simulate_lost_response(self):
+        with self._lock:
+            lost = self._lost_responses > 0
+            if lost:
+                self._lost_responses -= 1
+        if lost:
+            self.calls["503"] += 1
+            raise unavailable_error()
+
+    def simulate_request(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            fail = self._forced_errors > 0 or self._rng.random() < self.error_rate
+            if self._forced_errors > 0:
+                self._forced_errors -= 1
+        if fail:
+            self.calls["429"] += 1
+            raise quota_error()
+
+
+def from_env() -> FakeClient:
+    """FITNESS_SHEETS_CLIENT 使用的工厂：行数取自 FAKE_SHEETS_ROWS（默认 500），
+    延迟和 429 概率取自 FAKE_SHEETS_LATENCY / FAKE_SHEETS_429_RATE（默认 0）"""
+    return FakeClient(
+        synthetic_sheets(int(os.environ.get("FAKE_SHEETS_ROWS", "500"))),
+        latency=float(os.environ.get("FAKE_SHEETS_LATENCY", "0")),
+        error_rate=float(os.environ.get("FAKE_SHEETS_429_RATE", "0")),
+    )
+
+
+def with_auth_imports() -> FakeClient:
+    """冷启动基准用的工厂：和真实客户端一样导入 google-auth（gspread 已随本模块导入），返回空表格的替身"""
+    from google.oauth2.service_account import Credentials  # noqa: F401
+
+    return FakeClient({})
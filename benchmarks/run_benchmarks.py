@@ -0,0 +1,659 @@
+"""离线基准测试：用本地替身客户端和合成工作表给各阶段计时，并与基线对比。
+
+    python -m benchmarks.run_benchmarks                    # 默认规模 50 / 500 / 5000 / 50000 行
+    python -m benchmarks.run_benchmarks --sizes 50 500     # 只跑部分规模
+    python -m benchmarks.run_benchmarks --update-baseline  # 把本次结果写成新基线
+
+只有与机器无关的计数参与门禁（counts）：Google API 调用次数、每次运行的阶段调用数、发送的字节数和元素数、
+各视图 HTML 字节数、数据集内存。合成数据是固定种子生成的，这些数在任何机器上都一样，超出基线 count_tolerance
+即为回归。计时（results）受机器和负载影响很大，默认只报告：每个规模开始前先跑一遍固定工作量的校准循环，
+比较时把基线按两次校准的比值折算，加 --gate-timings 才参与门禁。
+本次测到、基线里却没有的指标一律算失败（基线过期，用 --update-baseline 重新生成），退出码为 1。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "streamlit_app.py")
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_SIZES = (50, 500, 5000, 50000)
+
+sys.path.insert(0, ROOT)
+
+import streamlit as st  # noqa: E402
+from streamlit.logger import set_log_level  # noqa: E402
+
+set_log_level("error")  # 裸模式下每个 st.* 调用都会打警告
+os.environ.setdefault("FITNESS_LOG_LEVEL", "ERROR")  # 计时输出里不混进 run_metrics 和模拟 429 / 503 的重试日志
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import streamlit_app as app  # noqa: E402
+from benchmarks.fake_gspread import FakeClient, synthetic_sheets  # noqa: E402
+
+
+def _median_ms(fn, repeat: int, setup=None) -> float:
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def _calibration_ms(repeat: int) -> float:
+    """固定工作量的参考循环（字符串拼接 + pandas 分组 / 字符串列运算，与渲染、规整的开销构成相近），
+    计时按它折算，抵消机器快慢和当时的负载"""
+    frame = pd.DataFrame({"n": np.arange(100_000) % 97, "s": [f"动作{i % 113}" for i in range(100_000)]})
+
+    def work():
+        "".join(f"<td>{i}</td>" for i in range(100_000))
+        frame.groupby("s", sort=False)["n"].sum()
+        frame["s"].str.len().sum()
+
+    return _median_ms(work, max(repeat, 5))
+
+
+def _reset_all(snapshot_path: str):
+    """冷启动：清空所有缓存和本地快照"""
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    app._CLASSIFIERS.clear()
+    if os.path.exists(snapshot_path):
+        os.remove(snapshot_path)
+
+
+def _reset_render():
+    """只清渲染相关的缓存（HTML LRU 和样式分类表），数据缓存保持不变"""
+    app._html_cache().clear()
+    app._compiled_classifiers.clear()
+    app._CLASSIFIERS.clear()
+
+
+def bench_functions(n_rows: int, workdir: str, repeat: int) -> dict:
+    snapshot_path = os.path.join(workdir, f"functions-{n_rows}.sqlite")
+    app.SNAPSHOT_PATH = snapshot_path
+    gc = FakeClient(synthetic_sheets(n_rows))
+    results = {}
+
+    results["load_snapshot/cold"] = _median_ms(lambda: app.load_snapshot(gc), repeat, lambda: _reset_all(snapshot_path))
+    results["load_sheet/cold"] = _median_ms(lambda: app.load_sheet(gc, "动作库"), repeat, lambda: _reset_all(snapshot_path))
+    app.load_snapshot(gc)
+    results["load_sheet/warm"] = _median_ms(lambda: app.load_sheet(gc, "动作库"), repeat)
+
+    weekly_raw = app._values_to_df(gc.sheets["周训练计划"])
+    results["get_day_data"] = _median_ms(lambda: app.get_day_data(weekly_raw), repeat)
+
+    weekly = app.load_dataset(gc, "周训练计划")
+    body = app.load_dataset(gc, "身体状况与禁忌")
+    lib = app.load_dataset(gc, "动作库")
+    tnotes = app.load_dataset(gc, "训练笔记")
+    days = list(weekly["groups"])
+
+    def timed(name, fn):
+        results[name] = _median_ms(fn, repeat, _reset_render)
+
+    timed("render_table_with_rowspan[周训练计划]", lambda: app.render_table_with_rowspan(weekly["frame"]))
+    timed("render_table_with_rowspan[身体状况与禁忌]", lambda: app.render_table_with_rowspan(body["frame"]))
+    timed("render_weekly_table", lambda: app.render_weekly_table(weekly, days))
+    timed("render_simple_table[动作库]", lambda: app.render_simple_table(lib["frame"]))
+    timed("render_simple_table[训练笔记]", lambda: app.render_simple_table(tnotes["frame"]))
+    timed("weekly_filter_payload", lambda: app.weekly_filter_payload(weekly))
+    timed(
+        "table_filter_payload[动作库]",
+        lambda: app.table_filter_payload(lib["frame"], [("动作类型", "类型")], "共 {rows} 个动作"),
+    )
+    timed(
+        "render_mobile_day[全部训练日]",
+        lambda: [app.render_mobile_day(d, app.group_rows(weekly, d), weekly["cols"]) for d in days],
+    )
+    all_rows = range(len(weekly["records"]))
+    results["filter/high_intensity[周训练计划]"] = _median_ms(lambda: app.high_intensity(weekly, all_rows), repeat)
+    index = app._SearchIndex(tnotes["frame"], app.SEARCH_FIELDS["训练笔记"])
+    results["search/index[训练笔记]"] = _median_ms(
+        lambda: app._SearchIndex(tnotes["frame"], app.SEARCH_FIELDS["训练笔记"]), min(repeat, 2),
+    )
+    results["search/query[少量命中]"] = _median_ms(lambda: index.search("问题12"), repeat)
+    results["search/query[大量命中]"] = _median_ms(lambda: index.search("臀大肌"), repeat)
+    _check_search()
+    _check_parsers()
+    timed("render_mobile_body", lambda: app.render_mobile_body(body["records"]))
+    timed("render_mobile_lib", lambda: app.render_mobile_lib(lib["records"], lib["cols"]))
+    timed("render_mobile_notes", lambda: app.render_mobile_notes(tnotes["records"], tnotes["cols"]))
+    return results
+
+
+def _check_parsers():
+    """组数、次数的区间取下限，计时动作不计次数"""
+    cases = {"4x10": (4, 10), "3×8-12": (3, 8), "3-4x8": (3, 8), "3～4组x每侧10次": (3, 10), "3x30秒": (3, None)}
+    parsed = app.parse_sets_reps(pd.Series(list(cases)))
+    found = {
+        text: (int(sets), None if pd.isna(reps) else int(reps))
+        for text, sets, reps in zip(cases, parsed["组数"], parsed["次数"])
+    }
+    if found != cases:
+        raise RuntimeError(f"sets/reps parser broken: {found}")
+
+
+def _check_search():
+    """英文按前缀匹配；只有标点、emoji 的搜索词不筛选"""
+    frame = pd.DataFrame({"动作名称": ["Back Squat", "Squat Jump", "Bench Press"], "目标肌群": ["臀大肌", "股四头肌", "胸大肌"]})
+    index = app._SearchIndex(frame, app.SEARCH_FIELDS["动作库"])
+    dataset = {"frame": frame, "records": frame.values.tolist(), "hash": "check"}
+    found = {
+        "squ": index.search("squ"),
+        "squ 臀": index.search("squ 臀"),
+        "be pr": index.search("be pr"),
+        "！？": len(app.search_dataset("check", dataset, "动作库", "！？")[1]),
+    }
+    if found != {"squ": [0, 1], "squ 臀": [0], "be pr": [2], "！？": 3}:
+        raise RuntimeError(f"search broken: {found}")
+
+
+def bench_fetch(n_rows: int, repeat: int, counts: dict) -> dict:
+    """并发冷启动与 429 重试：16 个会话同时拉取应合并成一次请求；counts 里记下每种场景的 API 调用次数"""
+    app.BACKOFF_BASE = 0.001  # 只验证重试路径，不等真实的退避时间；随机退避压到 3 ms 以内，不掩盖重试本身的开销
+    sheets = synthetic_sheets(n_rows)
+    results = {}
+
+    def stampede():
+        gc = FakeClient(sheets, latency=0.05)
+        fetcher = app._SheetsFetcher(gc, app.QUOTA_PER_MINUTE)
+        threads = [threading.Thread(target=fetcher.fetch) for _ in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if gc.calls["values_batch_get"] != 1:
+            raise RuntimeError(f"single-flight broken: {dict(gc.calls)}")
+        if fetcher.stats_snapshot()["fetches"] + fetcher.stats_snapshot()["coalesced"] != 16:
+            raise RuntimeError(f"fetch stats lost updates: {fetcher.stats_snapshot()}")
+        counts["calls/fetch/16 并发"] = _api_calls(gc)
+
+    def throttled():
+        gc = FakeClient(sheets)
+        gc.fail_next(2)
+        app._SheetsFetcher(gc, app.QUOTA_PER_MINUTE).fetch()
+        counts["calls/fetch/2 次 429 后成功"] = _api_calls(gc)
+
+    results["fetch/16 并发"] = _median_ms(stampede, repeat)
+    results["fetch/2 次 429 后成功"] = _median_ms(throttled, repeat)
+    return results
+
+
+def _api_calls(gc) -> int:
+    """替身客户端收到的请求数（429 只是某次请求的结果，不另算）"""
+    return sum(n for name, n in gc.calls.items() if name != "429")
+
+
+def bench_logging(n_rows: int, workdir: str, repeat: int, counts: dict) -> dict:
+    """训练记录：记录一组只写本地队列（Google 有 0.5 秒延迟也不受影响），200 组合成一次追加；
+    追加成功但响应丢失时，重发前按记录ID去重。与表格行数无关，每个规模各用一组新的队列文件"""
+    app.SNAPSHOT_PATH = os.path.join(workdir, f"logging-{n_rows}.sqlite")
+    results = {}
+    set_numbers = iter(range(10**9))
+    queues = iter(range(10**9))
+
+    def enqueue():
+        app.log_set("bench", "第1天：下肢+核心", "深蹲", next(set_numbers), 8, 60.0, 8.0)
+
+    def batch():
+        app.SNAPSHOT_PATH = os.path.join(workdir, f"logging-{n_rows}-{next(queues)}.sqlite")  # 每次从空队列开始
+        gc = FakeClient({}, latency=0.05)
+        for set_no in range(200):
+            app.log_set("bench", "第1天：下肢+核心", "深蹲", set_no, 8, 60.0, 8.0)
+        fetcher = app._SheetsFetcher(gc, app.QUOTA_PER_MINUTE)
+        app._LogWriter(fetcher).flush()
+        if gc.calls["values_append"] != 2:  # 表头 + 一批记录
+            raise RuntimeError(f"batching broken: {dict(gc.calls)}")
+        # 写请求（新建工作表、表头、一批记录）只算写配额，读配额只有打开表格那一次
+        if (fetcher.quota_used(), fetcher.quota_used("write")) != (app.API_CALLS_PER_FETCH, 3):
+            raise RuntimeError(f"write quota leaks into reads: {fetcher.stats_snapshot()}")
+        counts["calls/log/flush 200 组"] = _api_calls(gc)
+
+    def lost_response():
+        app.SNAPSHOT_PATH = os.path.join(workdir, f"logging-{n_rows}-{next(queues)}.sqlite")  # 每次从空队列开始
+        gc = FakeClient({app.LOG_SHEET: [list(app.LOG_HEADER)]})
+        for set_no in range(20):
+            app.log_set("bench", "第1天：下肢+核心", "深蹲", set_no, 8, 60.0, 8.0)
+        writer = app._LogWriter(app._SheetsFetcher(gc, app.QUOTA_PER_MINUTE))
+        gc.drop_next_response()
+        writer.flush()
+        writer._backoff.clear()  # 不等退避时间
+        writer.flush()
+        ids = [row[0] for row in gc.sheets[app.LOG_SHEET][1:]]
+        if len(ids) != 20 or len(set(ids)) != 20 or writer.stats["deduped"] != 20:
+            raise RuntimeError(f"dedup broken: {len(ids)} rows, {writer.stats}")
+        counts["calls/log/响应丢失后去重"] = _api_calls(gc)
+
+    results["log/enqueue"] = _median_ms(enqueue, repeat * 20)
+    results["log/flush 200 组"] = _median_ms(batch, repeat)
+    results["log/响应丢失后去重"] = _median_ms(lost_response, repeat)
+    return results
+
+
+def bench_progress(n_rows: int, workdir: str, repeat: int) -> dict:
+    """进度汇总：n_rows 条历史记录首次汇总 vs 之后每次只并入 20 条新记录 vs 重跑时只读汇总；
+    训练笔记状态跟踪：首次、内容不变、1% 的问题状态变化"""
+    from contextlib import closing
+    counter = iter(range(10**9))
+    sheets = synthetic_sheets(n_rows)
+    notes = app._values_to_df(sheets["训练笔记"])
+    rng_days = [f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}" for i in range(n_rows)]
+
+    def fill(path, n, offset=0):
+        app.SNAPSHOT_PATH = path
+        rows = [
+            (f"{offset + i}", "bench", rng_days[i % n_rows], "第1天：下肢+核心", offset + i, json.dumps(
+                ["", "", rng_days[i % n_rows], "第1天：下肢+核心", f"动作{i % 50}", 1, 8, 60.0 + i % 40, 8.0],
+                ensure_ascii=False,
+            ))
+            for i in range(n)
+        ]
+        with closing(app._log_connect()) as conn, conn:
+            conn.executemany(
+                "INSERT INTO log_queue (id, spreadsheet, date, day, created_at, payload) VALUES (?, ?, ?, ?, ?, ?)", rows,
+            )
+
+    def fresh():
+        fill(os.path.join(workdir, f"progress-{n_rows}-{next(counter)}.sqlite"), n_rows)
+
+    results = {"progress/rollup 全量": _median_ms(lambda: app.update_log_rollups("bench"), repeat, fresh)}
+    fresh()
+    app.update_log_rollups("bench")
+    offset = iter(range(n_rows, 10**9, 20))
+    results["progress/rollup 增量 20 条"] = _median_ms(
+        lambda: app.update_log_rollups("bench"), repeat, lambda: fill(app.SNAPSHOT_PATH, 20, next(offset)),
+    )
+    results["progress/读取趋势"] = _median_ms(
+        lambda: (app.update_log_rollups("bench"), app.progress_trend("bench", "动作1")), repeat,
+    )
+
+    def track(frame, content_hash):
+        return lambda: app.track_note_status("bench", frame, content_hash, time.time())
+
+    flipped = notes.assign(状态=notes["状态"].where(notes.index % 100 != 0, "已修正"))
+    results["progress/notes 首次"] = _median_ms(track(notes, "h0"), repeat, fresh)
+    results["progress/notes 未变"] = _median_ms(track(notes, "h0"), repeat)
+    results["progress/notes 1% 变化"] = _median_ms(
+        track(flipped, "h1"), repeat, lambda: (fresh(), app.track_note_status("bench", notes, "h0", time.time())),
+    )
+    _check_note_edits(os.path.join(workdir, f"progress-{n_rows}-edits.sqlite"))
+    _check_log_seed(workdir, n_rows)
+    return results
+
+
+def _check_log_seed(workdir: str, n_rows: int):
+    """本地没有水位线（重新部署后）时从「训练记录」工作表补历史：已同步的以表为准，未同步的只算一次；
+    没有这张工作表时当作没有历史；读表失败时不写水位线，下次进入页面再补"""
+    day = "第1天：下肢+核心"
+    synced = [app.log_entry_id("seed", "2026-03-02", day, "深蹲", 1), "", "2026-03-02", day, "深蹲", "1", "8", "60", "8"]
+    history = [[f"h{i}", "", "2026-02-23", day, "深蹲", str(i), "8", "55", "7"] for i in range(5)]
+
+    def weekly_sets(name, sheets, fail=False):
+        app.SNAPSHOT_PATH = os.path.join(workdir, f"progress-{n_rows}-seed-{name}.sqlite")
+        app.log_set("seed", day, "深蹲", 1, 8, 60.0, 8.0, date="2026-03-02")
+        app.log_set("seed", day, "深蹲", 2, 8, 60.0, 8.0, date="2026-03-02")
+        gc = FakeClient(sheets)
+        fetcher = app._SheetsFetcher(gc, app.QUOTA_PER_MINUTE)
+        if fail:
+            gc.fail_next()
+            if app.update_log_rollups("seed", fetcher) or app.progress_exercises("seed"):
+                raise RuntimeError("log seed rolled up without the worksheet history")
+        app.update_log_rollups("seed", fetcher)
+        return app.progress_trend("seed", "深蹲")["组数"].tolist()
+
+    with_history = {app.LOG_SHEET: [list(app.LOG_HEADER)] + history + [synced]}
+    found = {
+        "history": weekly_sets("history", with_history),
+        "no sheet": weekly_sets("no-sheet", {}),
+        "retry": weekly_sets("retry", with_history, fail=True),
+    }
+    if found != {"history": [5, 2], "no sheet": [2], "retry": [5, 2]}:
+        raise RuntimeError(f"log seed broken: {found}")
+
+
+def _check_note_edits(path: str):
+    """改了问题描述的笔记沿用原来的观察时间，删掉的笔记不再算「仍在观察」，修正后重新打开的笔记重新计时"""
+    from contextlib import closing
+    app.SNAPSHOT_PATH = path
+    columns = ["日期", "动作名称", "问题发现", "修正建议", "优先级", "状态"]
+    squat = ["2026-03-01", "深蹲", "膝内扣", "", "高", "观察中"]
+    deadlift = ["2026-03-02", "硬拉", "圆背", "", "高", "观察中"]
+    seen_at = time.mktime((2026, 3, 11, 0, 0, 0, 0, 0, -1))
+    app.track_note_status("check", pd.DataFrame([squat, deadlift], columns=columns), "v0", seen_at)
+    squat_fixed = ["2026-03-01", "深蹲", "膝盖内扣（已调整站距）", "", "高", "已修正"]
+    app.track_note_status("check", pd.DataFrame([squat_fixed], columns=columns), "v1", seen_at)
+    durations = app.note_durations("check").set_index("动作名称")
+    if list(durations.index) != ["深蹲"] or durations.loc["深蹲", "已修正"] != 1 or durations["仍在观察"].sum():
+        raise RuntimeError(f"note edits broken:\n{durations}")
+
+    # 修正后又改回「观察中」：不再算已修正，从改回的那次快照重新计时；再次修正时按新的起点算天数
+    reopened_at, refixed_at = seen_at + 9 * 86400, seen_at + 12 * 86400
+    squat_reopened = squat_fixed[:5] + ["观察中"]
+    app.track_note_status("check", pd.DataFrame([squat_reopened], columns=columns), "v2", reopened_at)
+    with closing(app._rollup_connect()) as conn:
+        reopened = conn.execute("SELECT observing_since, resolved_at FROM note_status WHERE status = '观察中'").fetchall()
+    durations = app.note_durations("check").set_index("动作名称")
+    if reopened != [(reopened_at, None)] or durations.loc["深蹲", "已修正"] or durations.loc["深蹲", "仍在观察"] != 1:
+        raise RuntimeError(f"note reopen broken: {reopened}\n{durations}")
+    app.track_note_status("check", pd.DataFrame([squat_fixed], columns=columns), "v3", refixed_at)
+    durations = app.note_durations("check").set_index("动作名称")
+    if durations.loc["深蹲", "已修正"] != 1 or durations.loc["深蹲", "最长天数"] != 3:
+        raise RuntimeError(f"note re-resolve broken:\n{durations}")
+
+
+def bench_memory(n_rows: int) -> dict:
+    """{工作表: (原始布局 KB, 规整后 KB)}；原始布局 = 全字符串 DataFrame + 逐行 itertuples 的记录"""
+    report = {}
+    for title, values in synthetic_sheets(n_rows).items():
+        raw = app._values_to_df(values)
+        raw_bytes = int(raw.memory_usage(deep=True).sum()) + app._records_nbytes(
+            list(raw.itertuples(index=False, name=None))
+        )
+        dataset = app.normalize_sheet(title, app._values_to_df(values))
+        report[title] = (round(raw_bytes / 1024, 1), round(app._dataset_nbytes(dataset) / 1024, 1))
+    return report
+
+
+def _view_payloads(datasets: dict) -> dict:
+    """{视图: HTML 字节数}，与在线版每次运行发送的内容一致（手机训练日含热身和拉伸，长列表取第一页）"""
+    _reset_render()  # HTML 缓存和编译好的分类表都带着上一种模式的 style/class
+    weekly, lib = datasets["周训练计划"], datasets["动作库"]
+    body, tnotes = datasets["身体状况与禁忌"], datasets["训练笔记"]
+    days = list(weekly["groups"])
+    page = slice(0, app.PAGE_SIZE)
+
+    def mobile(fragments):
+        return app._mobile_document(fragments)[0]
+
+    html = {
+        "mobile/训练日": "".join(
+            mobile(app._mobile_day_fragments(d, app.group_rows(weekly, d), weekly["cols"])) for d in days[:3]
+        ),
+        "mobile/动作库": mobile(app._mobile_lib_fragments(lib["records"][page], lib["cols"])),
+        "mobile/身体状况": mobile(app._mobile_body_fragments(body["records"])),
+        "mobile/训练笔记": mobile(app._mobile_notes_fragments(tnotes["records"][page], tnotes["cols"])),
+        "desktop/周训练计划": app.render_weekly_table(weekly, days),
+        "desktop/动作库": app.render_simple_table(lib["frame"].iloc[page]),
+        "desktop/身体状况": app.render_table_with_rowspan(body["frame"]),
+        "css/每页样式": app.page_css(),
+    }
+    return {name: len(text.encode("utf-8")) for name, text in html.items()}
+
+
+def bench_payload(n_rows: int) -> dict:
+    """{视图: (内联 style 字节, class 模式字节)}；class 模式的样式表单独一行，每页发送一次"""
+    datasets = {title: app.normalize_sheet(title, app._values_to_df(v)) for title, v in synthetic_sheets(n_rows).items()}
+    mode = app.CSS_CLASSES
+    try:
+        app.CSS_CLASSES = False
+        inline = _view_payloads(datasets)
+        app.CSS_CLASSES = True
+        classes = _view_payloads(datasets)
+    finally:
+        app.CSS_CLASSES = mode
+        _reset_render()
+    return {name: (inline[name], classes[name]) for name in inline}
+
+
+def bench_app(n_rows: int, workdir: str, repeat: int, counts: dict) -> dict:
+    """通过 AppTest 完整运行脚本：首次（冷缓存、无快照）与再次运行（热缓存）。
+
+    AppTest 每次运行都会重新编译脚本（真实服务器会缓存字节码），热运行时间里包含这部分随脚本体积增长的开销。
+    counts 里记下每次运行 run_metrics 中的阶段调用数、发送的字节数和元素数（缓存失效、多发元素都会体现在这里）。
+    """
+    from streamlit.testing.v1 import AppTest
+
+    runs = []
+
+    class Capture(logging.Handler):
+        def emit(self, record):
+            message = record.getMessage()
+            if message.startswith("run_metrics "):
+                runs.append(json.loads(message[len("run_metrics "):]))
+
+    capture = Capture(logging.INFO)
+    app_logger = logging.getLogger("fitness_dashboard")
+    level = app_logger.level
+    app_logger.addHandler(capture)
+    app_logger.setLevel(logging.INFO)  # 门禁要读 run_metrics；输出仍由 App 自己的 handler 按 FITNESS_LOG_LEVEL 过滤
+
+    snapshot_path = os.path.join(workdir, f"app-{n_rows}.sqlite")
+    os.environ["FITNESS_SHEETS_CLIENT"] = "benchmarks.fake_gspread:from_env"
+    os.environ["FAKE_SHEETS_ROWS"] = str(n_rows)
+    os.environ["FITNESS_SNAPSHOT_PATH"] = snapshot_path
+    results = {}
+    for device in ("desktop", "mobile"):
+        cold, warm = [], []
+        for _ in range(repeat):
+            _reset_all(snapshot_path)
+            at = AppTest.from_file(APP_PATH, default_timeout=600)
+            at.query_params["device"] = device
+            for phase, samples in (("cold", cold), ("warm", warm)):
+                runs.clear()
+                t0 = time.perf_counter()
+                at.run()
+                samples.append((time.perf_counter() - t0) * 1000)
+                if at.exception:
+                    raise RuntimeError(f"app run failed ({device}, {n_rows} rows): {at.exception[0].value}")
+                stages = [r for r in runs if r["scope"] == "page"][-1]["stages"]
+                emits = [v for k, v in stages.items() if k.startswith("emit/")]
+                counts[f"app/{device}/{phase}/阶段调用"] = sum(v["n"] for v in stages.values())
+                counts[f"app/{device}/{phase}/字节"] = sum(v["bytes"] for v in emits)
+                counts[f"app/{device}/{phase}/元素"] = sum(v["elements"] for v in emits)
+        results[f"app/{device}/cold"] = round(statistics.median(cold), 3)
+        results[f"app/{device}/warm"] = round(statistics.median(warm), 3)
+    app_logger.removeHandler(capture)
+    app_logger.setLevel(level)
+    return results
+
+
+# 冷进程里导入 App 模块：只统计 streamlit_app 自己的导入时间（streamlit 本身先导入）
+_IMPORT_SNIPPET = """
+import json, sys, time
+import streamlit
+t0 = time.perf_counter()
+import streamlit_app
+print(json.dumps({"ms": (time.perf_counter() - t0) * 1000, "gspread": "gspread" in sys.modules}))
+"""
+
+# 冷进程里第一次创建 Sheets 客户端：读 client/create 阶段的耗时（含 gspread / google-auth 的导入）
+_CLIENT_SNIPPET = """
+import json
+import streamlit_app
+streamlit_app._get_client().get()
+calls, seconds, _, _ = streamlit_app._stage_counters().stages["client/create"]
+print(json.dumps({"ms": seconds * 1000, "calls": calls}))
+"""
+
+# 冷进程里的第一次整页运行：从 run_metrics 日志里取第一个元素、第一个视图的时间
+_FIRST_RUN_SNIPPET = """
+import json, logging, sys, time
+from streamlit.testing.v1 import AppTest
+
+runs = []
+class Capture(logging.Handler):
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith("run_metrics "):
+            runs.append(json.loads(message[len("run_metrics "):]))
+logger = logging.getLogger("fitness_dashboard")
+logger.addHandler(Capture())
+logger.setLevel(logging.INFO)
+
+at = AppTest.from_file(sys.argv[1], default_timeout=600)
+at.query_params["device"] = sys.argv[2]
+t0 = time.perf_counter()
+at.run()
+total = (time.perf_counter() - t0) * 1000
+if at.exception:
+    raise SystemExit(at.exception[0].value)
+page = [r for r in runs if r["scope"] == "page"][-1]
+print(json.dumps({
+    "first_run": total, "first_element": page["first_element_ms"], "first_view": page["first_view_ms"],
+    "gspread": "gspread" in sys.modules,
+}))
+"""
+
+
+def _run_snippet(snippet: str, *args, env=None) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", snippet, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def bench_startup(n_rows: int, workdir: str, repeat: int) -> dict:
+    """冷启动：新进程导入 App 模块的时间、第一次创建 Sheets 客户端的时间，
+    以及本地已有快照时第一次整页运行中第一个元素、第一个视图出现的时间。
+    这两种情况下都不应导入 gspread / google-auth（客户端等到真正访问 Google 时才创建）"""
+    snapshot_path = os.path.join(workdir, f"startup-{n_rows}.sqlite")
+    app.SNAPSHOT_PATH = snapshot_path
+    app._snapshot_write(synthetic_sheets(n_rows), app.SPREADSHEET_ID)
+    env = dict(
+        os.environ, FITNESS_SHEETS_CLIENT="benchmarks.fake_gspread:from_env", FAKE_SHEETS_ROWS=str(n_rows),
+        FITNESS_SNAPSHOT_PATH=snapshot_path,
+    )
+    samples = {}
+    for _ in range(repeat):
+        imported = _run_snippet(_IMPORT_SNIPPET, env=env)
+        samples.setdefault("startup/import", []).append(imported["ms"])
+        created = _run_snippet(_CLIENT_SNIPPET, env=dict(env, FITNESS_SHEETS_CLIENT="benchmarks.fake_gspread:with_auth_imports"))
+        if created["calls"] != 1:
+            raise RuntimeError(f"client created {created['calls']} times")
+        samples.setdefault("startup/client/create", []).append(created["ms"])
+        for device in ("desktop", "mobile"):
+            run = _run_snippet(_FIRST_RUN_SNIPPET, APP_PATH, device, env=env)
+            if imported["gspread"] or run["gspread"]:
+                raise RuntimeError(f"gspread imported on a snapshot-only cold start ({device})")
+            for name in ("first_element", "first_view", "first_run"):
+                samples.setdefault(f"startup/{device}/{name}", []).append(run[name])
+    return {name: round(statistics.median(values), 3) for name, values in samples.items()}
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_delta: float = 0.0, scale=None) -> tuple:
+    """返回 (回归项 [(规模, 指标, 基线值, 当前值)], 基线里没有的项 [(规模, 指标)])。
+
+    scale：{规模: 本次校准 ms / 基线校准 ms}；给定时基线计时先按它折算再比较。
+    """
+    regressions, missing = [], []
+    for size, metrics in current.items():
+        factor = (scale or {}).get(size, 1.0)
+        for name, value in metrics.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                missing.append((size, name))
+            elif value > base * factor * (1 + tolerance) and value - base * factor > min_delta:
+                regressions.append((size, name, base * factor, value))
+    return regressions, missing
+
+
+def _ratio(value, base) -> str:
+    return f"{value / base:.2f}x" if base else "基线为 0"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数（取中位数；5 万行时自动减为 2）")
+    parser.add_argument("--skip-app", action="store_true", help="不跑 AppTest 全脚本计时和冷启动计时")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--count-tolerance", type=float, default=0.02, help="计数（调用次数、字节、元素、内存）允许比基线多的比例")
+    parser.add_argument("--gate-timings", action="store_true", help="计时也参与门禁（按校准循环折算后比较）")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="计时允许比基线慢的比例")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="计时低于该差值视为噪声")
+    parser.add_argument("--json", help="把本次结果另存到该路径")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="fitness-bench-")
+    results, counts, calibration, memory, payload = {}, {}, {}, {}, {}
+    try:
+        for n_rows in args.sizes:
+            repeat = args.repeat if n_rows < 50000 else min(args.repeat, 2)
+            size = str(n_rows)
+            calibration[size] = _calibration_ms(repeat)
+            print(f"{n_rows:>6} 行  校准循环 {calibration[size]:.2f} ms")
+            counts[size] = {}
+            metrics = bench_functions(n_rows, workdir, repeat)
+            metrics.update(bench_fetch(n_rows, repeat, counts[size]))
+            metrics.update(bench_logging(n_rows, workdir, repeat, counts[size]))
+            metrics.update(bench_progress(n_rows, workdir, repeat))
+            if not args.skip_app:
+                metrics.update(bench_app(n_rows, workdir, min(repeat, 3), counts[size]))
+                metrics.update(bench_startup(n_rows, workdir, min(repeat, 3)))
+            results[size] = metrics
+            for name, ms in metrics.items():
+                print(f"{n_rows:>6} 行  {name:<42} {ms:>10.2f} ms")
+            memory[size] = bench_memory(n_rows)
+            for title, (raw_kb, compact_kb) in memory[size].items():
+                print(f"{n_rows:>6} 行  memory/{title:<35} {raw_kb:>10.1f} KB → {compact_kb:.1f} KB")
+                counts[size][f"memory/{title} KB"] = compact_kb
+            payload[size] = bench_payload(n_rows)
+            for name, (inline, classes) in payload[size].items():
+                print(f"{n_rows:>6} 行  bytes/{name:<36} {inline:>10,} B → {classes:,} B（class 模式）")
+                counts[size][f"bytes/{name}"] = classes
+            for name, value in counts[size].items():
+                print(f"{n_rows:>6} 行  {name:<42} {value:>10,g}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(), "time": time.strftime("%Y-%m-%d %H:%M:%S")},
+        "calibration": calibration,
+        "counts": counts,
+        "results": results,
+        "memory": memory,
+        "payload": payload,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已更新：{args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("没有基线文件，跳过对比（用 --update-baseline 生成）")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions, missing = compare(counts, baseline.get("counts", {}), args.count_tolerance)
+    for size, name, base, value in regressions:
+        print(f"回归：{size} 行 {name}  {base:,g} → {value:,g}（{_ratio(value, base)}）")
+    base_calibration = baseline.get("calibration", {})
+    scale = {size: ms / base_calibration[size] for size, ms in calibration.items() if base_calibration.get(size)}
+    slower, missing_timings = compare(results, baseline["results"], args.tolerance, args.min_delta_ms, scale)
+    label = "回归" if args.gate_timings else "变慢（仅供参考）"
+    for size, name, base, ms in slower:
+        print(f"{label}：{size} 行 {name}  {base:.2f} ms → {ms:.2f} ms（按校准循环折算，{_ratio(ms, base)}）")
+    missing += missing_timings
+    for size, name in missing:
+        print(f"缺少基线：{size} 行 {name}")
+    failed = len(regressions) + len(missing) + (len(slower) if args.gate_timings else 0)
+    print(
+        f"共 {failed} 项失败：计数回归 {len(regressions)}（容差 {args.count_tolerance:.0%}），缺少基线 {len(missing)}，"
+        f"计时变慢 {len(slower)}（{'参与' if args.gate_timings else '不参与'}门禁；容差 {args.tolerance:.0%}，"
+        f"噪声下限 {args.min_delta_ms} ms）"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""把只读视图预渲染成静态 HTML：交给任意静态文件服务器即可访问，不占 Streamlit 会话和 websocket。
+
+    python -m static_export --out site                  # 所有计划，先从 Google 拉一次最新数据
+    python -m static_export --out site --plan 道长       # 只导出一份计划
+    python -m static_export --out site --from-snapshot  # 不联网，直接用本地快照
+    python -m static_export --out site --force          # 忽略清单，全部重写
+
+输出：site/<计划>/{mobile,desktop}/ 下每个训练日、动作库（按 PAGE_SIZE 分页）、身体状况、备注各一个页面，
+site/<计划>/index.html 按 User-Agent（或 ?device=）跳到手机版 / 电脑版。每个目录的 .manifest.json
+记录各页面的数据哈希，数据和渲染代码都没变的页面不重写，文件时间和 ETag 保持不变。
+适合用 cron 每隔几分钟跑一次；拉到的数据同时写入本地快照，在线版也能直接用。
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+from streamlit.logger import set_log_level
+
+set_log_level("error")  # 裸模式下每个 st.* 调用都会打警告
+
+import streamlit_app as app  # noqa: E402
+
+STATIC_SHEETS = ("周训练计划", "动作库", "身体状况与禁忌", "备注与说明")
+VARIANTS = (("mobile", True, "手机版"), ("desktop", False, "电脑版"))
+MANIFEST = ".manifest.json"
+NAV = (("index.html", "📅 训练计划"), ("library.html", "📚 动作库"), ("body.html", "🏥 身体状况"), ("notes.html", "📝 备注"))
+
+STATIC_CSS = """
+<style>
+body { margin: 0 auto; padding: 12px 16px 32px; font-family: -apple-system, "PingFang SC", "Microsoft YaHei", sans-serif; color: #1a1a2e; background: #fafafa; }
+body.mobile { max-width: 640px; }
+h1 { font-size: 24px; margin: 8px 0 12px; }
+nav, .pager, footer { display: flex; flex-wrap: wrap; gap: 8px; margin: 8px 0 16px; font-size: 14px; }
+nav a, .pager a, .day-list a { padding: 6px 12px; border-radius: 16px; background: #eef1f6; color: #1a1a2e; text-decoration: none; }
+nav a.current { background: #1a1a2e; color: #fff; }
+.day-list { display: flex; flex-direction: column; gap: 8px; margin-bottom: 16px; }
+.day-list a { border-radius: 8px; padding: 12px 14px; font-size: 16px; font-weight: 600; }
+details { margin-bottom: 12px; }
+summary { cursor: pointer; font-weight: 600; padding: 8px 0; }
+.caption { font-size: 13px; color: #888; }
+</style>
+"""
+
+
+def _slug(name: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]+', "-", name).strip("-") or "plan"
+
+
+def _renderer_version() -> str:
+    """渲染代码变了也要重写：两份源码一起算进页面哈希"""
+    sources = []
+    for path in (app.__file__, __file__):
+        with open(path, encoding="utf-8") as f:
+            sources.append(f.read())
+    return app._content_hash(sources)
+
+
+def _mobile_html(fragments) -> str:
+    return app._mobile_document(fragments)[0]
+
+
+def _notes_html(records, is_mobile: bool) -> str:
+    """与 view_notes 相同的结构，把 st.subheader / st.markdown 换成等价的 HTML"""
+    parts = []
+    for row in records:
+        topic = str(row[0]).strip()
+        content = str(row[1]).strip()
+        if topic == "" and content == "":
+            parts.append("<hr>")
+        elif content == "":
+            parts.append(f"<h3>{topic}</h3>")
+        elif is_mobile:
+            parts.append(
+                f'<div {app._css(app.STYLES["topic-row"])}><span {app._css(app.STYLES["topic"])}>{topic}</span>'
+                f'<br><span {app._css(app.STYLES["topic-content"])}>{content}</span></div>'
+            )
+        else:
+            parts.append(f"<p><b>{topic}</b>：{content}</p>")
+    return "\n".join(parts)
+
+
+def _day_files(day_names) -> dict:
+    return {day: f"day-{i}.html" for i, day in enumerate(day_names, 1)}
+
+
+def _pages(datasets: dict, is_mobile: bool) -> list:
+    """[(文件名, 标题, 数据键, 生成正文的函数)]；两个版本的文件名完全一致，便于互相切换"""
+    weekly, lib = datasets["周训练计划"], datasets["动作库"]
+    body, notes = datasets["身体状况与禁忌"], datasets["备注与说明"]
+    groups, cols = weekly["groups"], weekly["cols"]
+    day_names = list(groups)
+    warmup = next((d for d in day_names if "热身" in d), None)
+    stretch = next((d for d in day_names if "练后拉伸" in d), None)
+    training_days = [d for d in day_names if d not in (warmup, stretch)]
+    day_files = _day_files(training_days)
+
+    def day_list():
+        links = "".join(f'<a href="{day_files[d]}">{d}</a>' for d in training_days)
+        return f'<div class="day-list">{links}</div>'
+
+    def mobile_day(day, summary=None):
+        doc = _mobile_html(app._mobile_day_fragments(day, app.group_rows(weekly, day), cols))
+        return doc if summary is None else f"<details><summary>{summary}</summary>{doc}</details>"
+
+    def day_page(day):
+        if not is_mobile:
+            return app.render_weekly_table(weekly, [d for d in (warmup, day, stretch) if d])
+        extras = [
+            mobile_day(d, summary) for d, summary in
+            ((warmup, "🔥 每日通用热身（点击展开）"), (stretch, "🧘 每日练后拉伸（点击展开）")) if d
+        ]
+        return "".join(extras) + mobile_day(day)
+
+    def index_page():
+        if weekly["frame"].empty:
+            return "<p>无数据</p>"
+        if is_mobile:
+            return '<p class="caption">选择今天的训练日 👇</p>' + day_list()
+        return day_list() + app.render_weekly_table(weekly, day_names)
+
+    pages = [("index.html", "训练计划", [weekly["hash"]] if not is_mobile else [day_names], index_page)]
+    for day in training_days:
+        key = [groups[d]["hash"] for d in (warmup, day, stretch) if d]
+        pages.append((day_files[day], day, key, lambda d=day: day_page(d)))
+
+    # 动作库按 PAGE_SIZE 分页，只有内容变了的那几页会重写
+    records, n = lib["records"], len(lib["records"])
+    n_pages = max(-(-n // app.PAGE_SIZE), 1)
+    for p in range(n_pages):
+        start, stop = p * app.PAGE_SIZE, min((p + 1) * app.PAGE_SIZE, n)
+
+        def library_page(start=start, stop=stop, p=p):
+            if lib["frame"].empty:
+                return "<p>无数据</p>"
+            if is_mobile:
+                html = _mobile_html(app._mobile_lib_fragments(records[start:stop], lib["cols"]))
+            else:
+                html = app.render_simple_table(lib["frame"].iloc[start:stop])
+            pager = [
+                f'<a href="{_library_file(i)}">{label}</a>'
+                for i, label in ((p - 1, "上一页"), (p + 1, "下一页")) if 0 <= i < n_pages
+            ]
+            caption = app.page_caption(f"共 {n} 个动作", n, start, stop)
+            return html + f'<p class="caption">{caption}</p><div class="pager">{"".join(pager)}</div>'
+
+        key = [lib["header"], records[start:stop], n, n_pages]
+        pages.append((_library_file(p), "动作库", key, library_page))
+
+    def body_page():
+        if body["frame"].empty:
+            return "<p>无数据</p>"
+        if is_mobile:
+            return _mobile_html(app._mobile_body_fragments(body["records"]))
+        return app.render_table_with_rowspan(body["frame"], merge_col=0)
+
+    pages.append(("body.html", "身体状况", [body["hash"]], body_page))
+    pages.append((
+        "notes.html", "备注", [notes["hash"]],
+        lambda: _notes_html(notes["records"], is_mobile) if not notes["frame"].empty else "<p>无数据</p>",
+    ))
+    return pages
+
+
+def _library_file(page: int) -> str:
+    return "library.html" if page == 0 else f"library-{page + 1}.html"
+
+
+def _document(plan: str, title: str, filename: str, body: str, variant: str) -> str:
+    # 训练日页面归在"训练计划"下，动作库分页归在第一页下
+    section = {"day": "index.html", "library": "library.html"}.get(filename.split("-")[0].split(".")[0], filename)
+    nav = "".join(
+        f'<a href="{href}"{" class=current" if href == section else ""}>{label}</a>' for href, label in NAV
+    )
+    other, other_label = next((v, label) for v, _, label in VARIANTS if v != variant)
+    return (
+        '<!DOCTYPE html>\n<html lang="zh-CN">\n<head>\n<meta charset="utf-8">\n'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+        f"<title>{title} · {plan}训练计划</title>\n{app.page_css()}{STATIC_CSS}</head>\n"
+        f'<body class="{variant}">\n<h1>💪 {plan}训练计划</h1>\n<nav>{nav}</nav>\n<main>\n{body}\n</main>\n'
+        f'<footer><a href="../{other}/{filename}">切换到{other_label}</a></footer>\n</body>\n</html>\n'
+    )
+
+
+def _redirect_page(plan: str) -> str:
+    """按 ?device= 或 User-Agent 选择版本，规则与在线版 resolve_device_mode 一致"""
+    links = "".join(f'<a href="{v}/index.html">{label}</a> ' for v, _, label in VARIANTS)
+    return (
+        '<!DOCTYPE html>\n<html lang="zh-CN">\n<head>\n<meta charset="utf-8">\n'
+        f"<title>{plan}训练计划</title>\n<script>\n"
+        'var m = /[?&]device=(mobile|desktop)/.exec(location.search);\n'
+        f'var v = m ? m[1] : (/{app.MOBILE_UA.pattern}/i.test(navigator.userAgent) ? "mobile" : "desktop");\n'
+        'location.replace(v + "/index.html");\n'
+        f"</script>\n</head>\n<body><noscript>{links}</noscript></body>\n</html>\n"
+    )
+
+
+def _plans_index(plans) -> str:
+    links = "".join(f'<li><a href="{_slug(name)}/index.html">{name}</a></li>' for name in plans)
+    return (
+        '<!DOCTYPE html>\n<html lang="zh-CN">\n<head>\n<meta charset="utf-8">\n'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+        f"<title>训练计划</title>\n{STATIC_CSS}</head>\n<body>\n<h1>💪 训练计划</h1>\n<ul>{links}</ul>\n</body>\n</html>\n"
+    )
+
+
+def _write_atomic(path: str, text: str):
+    # 先写临时文件再改名：静态服务器不会读到写了一半的页面
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _write_if_changed(path: str, text: str) -> bool:
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    _write_atomic(path, text)
+    return True
+
+
+def _load_manifest(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_plan(plan: str, spreadsheet_id: str, fetched_at: float, out_dir: str, force: bool = False) -> dict:
+    """导出一份计划的全部静态页面，返回 {"written", "unchanged", "removed"} 计数"""
+    datasets = {title: app._snapshot_dataset(spreadsheet_id, title, fetched_at) for title in STATIC_SHEETS}
+    version = _renderer_version()
+    plan_dir = os.path.join(out_dir, _slug(plan))
+    counts = {"written": 0, "unchanged": 0, "removed": 0}
+    for variant, is_mobile, _ in VARIANTS:
+        directory = os.path.join(plan_dir, variant)
+        os.makedirs(directory, exist_ok=True)
+        old = _load_manifest(directory)
+        manifest = {}
+        for filename, title, key, render in _pages(datasets, is_mobile):
+            manifest[filename] = page_hash = app._content_hash([version, plan, title, key])
+            path = os.path.join(directory, filename)
+            if not force and old.get(filename) == page_hash and os.path.exists(path):
+                counts["unchanged"] += 1
+                continue
+            _write_atomic(path, _document(plan, title, filename, render(), variant))
+            counts["written"] += 1
+        # 训练日或动作库页数变少时，删掉不再存在的页面
+        for filename in set(old) - set(manifest):
+            path = os.path.join(directory, filename)
+            if os.path.exists(path):
+                os.remove(path)
+                counts["removed"] += 1
+        _write_atomic(os.path.join(directory, MANIFEST), json.dumps(manifest, ensure_ascii=False, indent=1))
+    _write_if_changed(os.path.join(plan_dir, "index.html"), _redirect_page(plan))
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="site", help="输出目录")
+    parser.add_argument("--plan", action="append", choices=list(app.PLANS), help="只导出这些计划（可重复）")
+    parser.add_argument("--from-snapshot", action="store_true", help="不请求 Google，用本地快照")
+    parser.add_argument("--force", action="store_true", help="忽略清单，重写所有页面")
+    args = parser.parse_args(argv)
+
+    plans = args.plan or list(app.PLANS)
+    gc = None if args.from_snapshot else app._get_client()
+    os.makedirs(args.out, exist_ok=True)
+    for plan in plans:
+        spreadsheet_id = app.PLANS[plan]
+        if args.from_snapshot:
+            fetched_at = app._snapshot_fetched_at(spreadsheet_id)
+            if fetched_at is None:
+                print(f"{plan}：本地没有快照（{app.SNAPSHOT_PATH}），去掉 --from-snapshot 重新拉取", file=sys.stderr)
+                return 1
+        else:
+            fetched_at = app._snapshot_write(app._sheets_fetcher(gc).fetch(spreadsheet_id), spreadsheet_id)
+        counts = export_plan(plan, spreadsheet_id, fetched_at, args.out, force=args.force)
+        print(
+            f"{plan}：写入 {counts['written']} 页 · 未变 {counts['unchanged']} 页 · 删除 {counts['removed']} 页"
+            f" → {os.path.join(args.out, _slug(plan))}"
+        )
+    exported = [p for p in app.PLANS if os.path.isdir(os.path.join(args.out, _slug(p)))]
+    _write_if_changed(os.path.join(args.out, "index.html"), _plans_index(exported))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,1652 @@
+import functools
+import hashlib
+import importlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from contextlib import closing, contextmanager
+from datetime import datetime
+from types import MappingProxyType
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
 import streamlit as st
+import streamlit.components.v1 as components
+import numpy as np
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
-from streamlit_js_eval import streamlit_js_eval
 
 SPREADSHEET_ID = "1Mej0V4ql4P6hFDPstAJX-aD_Uea3ualUWgSJun6qHjs"
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive",
 ]
+SHEET_TITLES = ("周训练计划", "动作库", "身体状况与禁忌", "备注与说明", "训练笔记")
+CACHE_TTL = 300  # 快照超过该秒数后在后台刷新
+RETRY_INTERVAL = 30  # 刷新失败后的最短重试间隔（秒）
+# 后台预取：每个进程一个线程，在快照过期前 PREFETCH_LEAD 秒刷新（设为 0 关闭，退回到过期后才刷新）
+PREFETCH = os.environ.get("FITNESS_PREFETCH", "1") != "0"
+PREFETCH_LEAD = int(os.environ.get("FITNESS_PREFETCH_LEAD", "60"))
+PREFETCH_POLL = 30  # 预取线程最长休眠时间（秒），新访问的计划最迟这么久后纳入预取
+QUOTA_PER_MINUTE = int(os.environ.get("FITNESS_SHEETS_QUOTA", "60"))  # Sheets API 每分钟读请求配额
+WRITE_QUOTA_PER_MINUTE = int(os.environ.get("FITNESS_SHEETS_WRITE_QUOTA", "60"))  # 写请求单独计配额
+FETCH_RETRIES = 4  # 429 / 5xx / 网络错误的最多重试次数
+BACKOFF_BASE = 1.0  # 指数退避的初始上限（秒），之后每次翻倍
+BACKOFF_CAP = 30.0
+SNAPSHOT_PATH = os.environ.get("FITNESS_SNAPSHOT_PATH", ".cache/sheets.sqlite")
+# 训练记录：手机训练日里记录的每一组先写本地队列（与快照同一个 SQLite 文件），
+# 后台线程每 LOG_FLUSH_INTERVAL 秒批量追加到「训练记录」工作表（设为 0 关闭记录功能）
+WORKOUT_LOG = os.environ.get("FITNESS_WORKOUT_LOG", "1") != "0"
+LOG_FLUSH_INTERVAL = int(os.environ.get("FITNESS_LOG_FLUSH", "30"))
+LOG_BATCH_MAX = 500  # 每次 values_append 最多追加的行数
+LOG_LEASE = 120  # 发送中的记录被本进程占用的秒数，进程中途退出后其它进程到期接手
+LOG_RETRY_CAP = 600  # 连续写回失败时重试间隔的上限（秒）
+# 训练记录的日期按哪个时区算（如 Asia/Shanghai）；不设置时用浏览器时区，取不到再用服务器本地时间（Streamlit Cloud 上是 UTC）
+LOG_TZ = os.environ.get("FITNESS_TZ", "")
+HTML_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 渲染结果 LRU 的内存上限
+# 规整后数据集 LRU 的内存上限（所有计划共用），超出时先淘汰最久没人看的计划
+DATASET_CACHE_MAX_BYTES = int(os.environ.get("FITNESS_DATASET_CACHE_MB", "256")) * 1024 * 1024
+# 多份训练计划："名称=表格ID,名称=表格ID"；?plan=名称 选择，默认第一份
+PLANS = {
+    name.strip(): sid.strip()
+    for name, _, sid in (item.partition("=") for item in os.environ.get("FITNESS_SPREADSHEETS", "").split(","))
+    if name.strip() and sid.strip()
+} or {"道长": SPREADSHEET_ID}
+PLAN_IDLE_TTL = 3600  # 超过该秒数没人访问的计划不再预取
+CLASSIFIER_MEMO_SIZE = 50_000  # 每个样式分类表最多缓存的不同取值数
+# 手机端每个视图合并成一个 st.markdown 元素发送（设为 0 恢复逐卡片发送）
+MOBILE_SINGLE_PAYLOAD = os.environ.get("FITNESS_MOBILE_SINGLE_PAYLOAD", "1") != "0"
+# 导航式视图：每次交互只加载、渲染当前视图（设为 0 恢复一次渲染全部 st.tabs）
+LAZY_TABS = os.environ.get("FITNESS_LAZY_TABS", "1") != "0"
+# 电脑端筛选在浏览器里完成（设为 0 恢复 st.multiselect + 服务端筛选）
+CLIENT_FILTERS = os.environ.get("FITNESS_CLIENT_FILTERS", "1") != "0"
+# 组件参数每次运行（包括 fragment 重跑、每次搜索）都整份重发，约 200 字节 / 行：
+# 动作库 / 训练笔记超过该行数时退回服务端筛选 + 分页，每次只发送当前页
+CLIENT_FILTER_MAX_ROWS = int(os.environ.get("FITNESS_CLIENT_FILTER_MAX_ROWS", "500"))
+# 长列表（动作库、训练笔记）每页的行数 / 卡片数：每次交互只构建、发送当前页
+PAGE_SIZE = int(os.environ.get("FITNESS_PAGE_SIZE", "50"))
+# 卡片、徽章、表格单元格输出短 class 名，样式表每页注入一次（设为 0 恢复逐元素内联 style）
+CSS_CLASSES = os.environ.get("FITNESS_CSS_CLASSES", "1") != "0"
+MOBILE_UA = re.compile(r"Mobi|Android|iPhone|iPod|Windows Phone", re.IGNORECASE)
+# "模块:函数"，用于本地开发 / 基准测试时替换 Google 客户端（如 benchmarks.fake_gspread:from_env）
+CLIENT_FACTORY = os.environ.get("FITNESS_SHEETS_CLIENT", "")
+# 分阶段性能埋点（设为 0 关闭）；FITNESS_DEBUG=1 或 ?debug=1 时在侧边栏显示明细
+METRICS = os.environ.get("FITNESS_METRICS", "1") != "0"
+DEBUG_PANEL = os.environ.get("FITNESS_DEBUG", "0") != "0"
+# 本应用日志（run_metrics、预取 / 刷新等）的级别，输出到 stderr
+LOG_LEVEL = os.environ.get("FITNESS_LOG_LEVEL", "INFO").upper()
+
+logger = logging.getLogger("fitness_dashboard")
+# Streamlit 不配置根 logger（有效级别是 WARNING），不单独挂 handler 的话 INFO 日志全被丢掉；
+# 模块顶层每次 rerun 都会重新执行，已有 handler（包括基准测试挂的）时不再重复挂
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _log_handler.setLevel(LOG_LEVEL)  # 基准测试为读 run_metrics 调低 logger 级别时，控制台输出不变
+    logger.addHandler(_log_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+# pandas 3 起写时复制是默认行为；2.x 显式打开，视图里的筛选 / 切片不会复制或改动进程内共享的数据集
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+# ============================================================
+# 性能埋点：各阶段的耗时、HTML 字节数和发送的元素数
+# ============================================================
+class _StageCounters:
+    """进程内累计计数（Prometheus 风格，只增不减），所有会话共享"""
+
+    FIELDS = (
+        ("fitness_stage_calls_total", "调用次数"),
+        ("fitness_stage_seconds_total", "累计耗时（秒）"),
+        ("fitness_stage_bytes_total", "累计 HTML 字节数"),
+        ("fitness_stage_elements_total", "累计发送的前端元素数"),
+    )
+
+    def __init__(self):
+        self.stages = {}  # 阶段 -> [次数, 秒, 字节, 元素]
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, nbytes, elements):
+        with self._lock:
+            totals = self.stages.get(stage)
+            if totals is None:
+                totals = self.stages[stage] = [0, 0.0, 0, 0]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += nbytes
+            totals[3] += elements
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            items = sorted((stage, list(totals)) for stage, totals in self.stages.items())
+        lines = []
+        for i, (name, help_text) in enumerate(self.FIELDS):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f'{name}{{stage="{stage}"}} {totals[i]:g}' for stage, totals in items)
+        return "\n".join(lines) + "\n"
 
-st.set_page_config(page_title="道长训练计划", page_icon="💪", layout="wide")
+
+@st.cache_resource
+def _stage_counters() -> _StageCounters:
+    return _StageCounters()
+
+
+# 本次运行（整页或单独重跑的 fragment）的明细；stages 为 None 表示不在脚本运行中（如基准测试直接调用）
+# first_element / first_view：整页运行开始后第一个元素、第一个视图渲染完成的时间（秒）
+_RUN = {"stages": None, "page": False, "started": 0.0, "counters": None, "first_element": None, "first_view": None}
+
+
+def record_stage(stage: str, seconds: float, nbytes: int = 0, elements: int = 0):
+    if not METRICS:
+        return
+    if _RUN["counters"] is None:
+        _RUN["counters"] = _stage_counters()
+    _RUN["counters"].add(stage, seconds, nbytes, elements)
+    if _RUN["stages"] is not None:
+        _RUN["stages"].append((stage, seconds, nbytes, elements))
+
+
+@contextmanager
+def stage_timer(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - t0)
+
+
+def timed(stage: str):
+    """装饰器：记录函数耗时；返回 str 时同时记录其 UTF-8 字节数"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            result = fn(*args, **kwargs)
+            nbytes = len(result.encode("utf-8")) if METRICS and isinstance(result, str) else 0
+            record_stage(stage, time.perf_counter() - t0, nbytes)
+            return result
+        return wrapper
+    return decorate
+
+
+def emit_html(html: str):
+    """st.markdown(unsafe_allow_html=True)，并记录发送的字节数和元素数"""
+    t0 = time.perf_counter()
+    st.markdown(html, unsafe_allow_html=True)
+    if _RUN["first_element"] is None and _RUN["page"]:
+        _RUN["first_element"] = time.perf_counter() - _RUN["started"]
+    if METRICS:
+        record_stage("emit/markdown", time.perf_counter() - t0, len(html.encode("utf-8")), 1)
+
+
+def _begin_run(page: bool):
+    _RUN.update(stages=[], page=page, started=time.perf_counter(), first_element=None, first_view=None)
+    PAYLOAD_SAVINGS.update(elements=0, bytes=0)
+
+
+def run_summary() -> list:
+    """本次运行按阶段汇总：[(阶段, 次数, 毫秒, 字节, 元素)]，按耗时降序"""
+    totals = {}
+    for stage, seconds, nbytes, elements in _RUN["stages"] or ():
+        t = totals.setdefault(stage, [0, 0.0, 0, 0])
+        t[0] += 1
+        t[1] += seconds * 1000
+        t[2] += nbytes
+        t[3] += elements
+    return sorted(((k, *v) for k, v in totals.items()), key=lambda r: -r[2])
+
+
+def _end_run(scope: str):
+    """输出一行结构化日志（JSON），便于按阶段聚合慢请求"""
+    if METRICS and _RUN["stages"] is not None:
+        logger.info("run_metrics %s", json.dumps(
+            {
+                "scope": scope,
+                "total_ms": round((time.perf_counter() - _RUN["started"]) * 1000, 2),
+                **{
+                    f"{name}_ms": round(_RUN[name] * 1000, 2)
+                    for name in ("first_element", "first_view") if _RUN[name] is not None
+                },
+                "stages": {
+                    stage: {"n": n, "ms": round(ms, 2), "bytes": nbytes, "elements": elements}
+                    for stage, n, ms, nbytes, elements in run_summary()
+                },
+            },
+            ensure_ascii=False,
+        ))
+    if PAYLOAD_SAVINGS["elements"]:
+        # fragment 单独重跑时也要输出，否则手机端视图内交互省下的量都没有记录
+        logger.info(
+            "mobile single payload (%s): elements_saved=%d bytes_saved=%d",
+            scope, PAYLOAD_SAVINGS["elements"], PAYLOAD_SAVINGS["bytes"],
+        )
+    # 运行结束后（如后台线程）记录的阶段只进进程累计计数，不再并进这次运行
+    _RUN.update(stages=None, page=False)
 
 
 # ============================================================
 # 数据加载
 # ============================================================
-@st.cache_resource
-def _get_client() -> gspread.Client:
+def _build_client():
+    if CLIENT_FACTORY:
+        module, _, attr = CLIENT_FACTORY.partition(":")
+        return getattr(importlib.import_module(module), attr)()
+    # gspread + google-auth 导入要几百毫秒，只在真正要访问 Google 时才导入
+    import gspread
+    from google.oauth2.service_account import Credentials
+
     conn_secrets = dict(st.secrets["connections"]["gsheets"])
     creds = Credentials.from_service_account_info(conn_secrets, scopes=SCOPES)
     return gspread.authorize(creds)
 
 
-@st.cache_data(ttl=300)
-def load_sheet(_gc, title):
-    sh = _gc.open_by_key(SPREADSHEET_ID)
-    ws = sh.worksheet(title)
-    values = ws.get_all_values()
+class _LazyClient:
+    """gspread 客户端的占位：第一次访问属性（即第一次真正请求 Google）时才创建。
+
+    冷启动时本地有快照就直接渲染，客户端由后台刷新线程按需创建；多个线程同时第一次访问时只创建一次。
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._client is not None
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    t0 = time.perf_counter()
+                    with stage_timer("client/create"):  # 含 gspread / google-auth 的导入
+                        self._client = self._factory()
+                    logger.info("sheets client ready in %.2fs", time.perf_counter() - t0)
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+@st.cache_resource
+def _get_client() -> _LazyClient:
+    return _LazyClient(_build_client)
+
+
+def _a1_sheet(title: str) -> str:
+    """整张工作表的 A1 范围（标题含单引号时需转义）"""
+    return "'" + title.replace("'", "''") + "'"
+
+
+def _values_to_df(values) -> pd.DataFrame:
     if not values or len(values) < 2:
         return pd.DataFrame()
-    return pd.DataFrame(values[1:], columns=values[0])
+    header = values[0]
+    width = len(header)
+    # 批量接口会裁掉行尾空单元格，这里补齐到表头宽度（与 get_all_values 一致）
+    rows = [row[:width] + [""] * (width - len(row)) for row in values[1:]]
+    return pd.DataFrame(rows, columns=header)
+
+
+def _fetch_all_values(gc, spreadsheet_id=SPREADSHEET_ID, titles=SHEET_TITLES) -> dict:
+    """一次 batchGet 拉取所有工作表的原始值：{标题: 二维列表}"""
+    sh = gc.open_by_key(spreadsheet_id)
+    resp = sh.values_batch_get([_a1_sheet(t) for t in titles])
+    ranges = resp.get("valueRanges", [])
+    return {title: vr.get("values", []) for title, vr in zip(titles, ranges)}
+
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+API_CALLS_PER_FETCH = 2  # open_by_key 读一次元数据 + values_batch_get
+
+
+def _status_code(exc):
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and code > 0:
+        return code
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def _is_retryable(exc) -> bool:
+    # requests 的连接 / 超时错误都是 OSError 的子类
+    return _status_code(exc) in RETRYABLE_STATUS or isinstance(exc, OSError)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """full jitter：在 [0, min(上限, 初始值 * 2^attempt)] 里均匀取值，避免各进程同时重试"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class _SheetsFetcher:
+    """包在 gspread 客户端外的一层：合并并发的相同拉取、按配额限速、带抖动的指数退避重试。
+
+    所有计划共用一个客户端和一份配额（读、写与 Google 一样各算各的）；重试期间页面继续读本地快照
+    （上一次成功的数据），不会阻塞在网络上。
+    """
 
+    def __init__(self, gc, quota_per_minute: int, write_quota_per_minute: int = WRITE_QUOTA_PER_MINUTE):
+        self.gc = gc
+        self.quota_per_minute = quota_per_minute
+        self.write_quota_per_minute = write_quota_per_minute
+        self.stats = {
+            "fetches": 0, "api_calls": 0, "write_calls": 0, "coalesced": 0, "throttled": 0, "retries": 0, "failures": 0,
+        }
+        self._windows = {"read": deque(), "write": deque()}  # 最近 60 秒内每次 API 调用的时间
+        self._inflight = {}  # (表格 ID, 工作表元组) -> {"done", "result", "error"}
+        self._lock = threading.Lock()
+
+    def fetch(self, spreadsheet_id=SPREADSHEET_ID, titles=SHEET_TITLES) -> dict:
+        """同一组工作表同时只有一个请求在路上，其余调用者等待并共享它的结果（或异常）"""
+        key = (spreadsheet_id, tuple(titles))
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = {"done": threading.Event(), "result": None, "error": None}
+            else:
+                self.stats["coalesced"] += 1  # 计数都在锁内更新，后台线程和会话线程同时拉取时不丢计数
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = self._fetch_with_retry(*key)
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call["done"].set()
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def _fetch_with_retry(self, spreadsheet_id, titles) -> dict:
+        self._count("fetches")
+        for attempt in range(FETCH_RETRIES + 1):
+            self._acquire_quota(API_CALLS_PER_FETCH)
+            try:
+                return _fetch_all_values(self.gc, spreadsheet_id, titles)
+            except Exception as e:
+                if _status_code(e) == 429:
+                    self._count("throttled")
+                if not _is_retryable(e) or attempt == FETCH_RETRIES:
+                    self._count("failures")
+                    raise
+                delay = _backoff_delay(attempt)
+                self._count("retries")
+                logger.warning("sheets fetch failed (%s), retry %d in %.1fs", e, attempt + 1, delay)
+                time.sleep(delay)
+
+    def _acquire_quota(self, n: int, kind: str = "read"):
+        """滑动窗口限速：最近 60 秒的调用数加上 n 超过配额时，等最早的调用移出窗口。
+
+        kind="write" 用单独的窗口和配额：批量写回训练记录不占页面拉取的读配额，反之亦然。
+        """
+        window = self._windows[kind]
+        quota = self.write_quota_per_minute if kind == "write" else self.quota_per_minute
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while window and now - window[0] >= 60:
+                    window.popleft()
+                if len(window) + n <= quota or not window:
+                    window.extend([now] * n)
+                    self.stats["write_calls" if kind == "write" else "api_calls"] += n
+                    return
+                wait = 60 - (now - window[0])
+            time.sleep(wait)
+
+    def quota_used(self, kind: str = "read") -> int:
+        """最近 60 秒内的读（或写）API 调用数"""
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for t in self._windows[kind] if now - t < 60)
+
+
+@st.cache_resource
+def _sheets_fetcher(_gc) -> _SheetsFetcher:
+    return _SheetsFetcher(_gc, QUOTA_PER_MINUTE)
+
+
+# ============================================================
+# 本地快照（SQLite）：先返回快照，过期后在后台刷新；每份计划一组行
+# ============================================================
+def _snapshot_connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(SNAPSHOT_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(SNAPSHOT_PATH, timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS snapshots ("
+        "spreadsheet TEXT NOT NULL, title TEXT NOT NULL, fetched_at REAL NOT NULL, payload TEXT NOT NULL, "
+        "PRIMARY KEY (spreadsheet, title))"
+    )
+    return conn
+
+
+def _snapshot_fetched_at(spreadsheet_id=SPREADSHEET_ID):
+    """快照的拉取时间（unix 秒），没有快照时返回 None"""
+    with closing(_snapshot_connect()) as conn:
+        return conn.execute(
+            "SELECT MIN(fetched_at) FROM snapshots WHERE spreadsheet = ?", (spreadsheet_id,)
+        ).fetchone()[0]
+
+
+@timed("snapshot/read")
+def _snapshot_read_one(spreadsheet_id: str, title: str) -> str:
+    """快照中某张工作表的 JSON 文本（解析延后到确认内容有变化之后）"""
+    with closing(_snapshot_connect()) as conn:
+        row = conn.execute(
+            "SELECT payload FROM snapshots WHERE spreadsheet = ? AND title = ?", (spreadsheet_id, title)
+        ).fetchone()
+    return row[0] if row else "[]"
+
+
+def _snapshot_write(values: dict, spreadsheet_id=SPREADSHEET_ID) -> float:
+    """在同一个事务里写入所有工作表，读者只会看到完整的新旧快照之一"""
+    now = time.time()
+    payloads = [
+        (spreadsheet_id, title, now, json.dumps(v, ensure_ascii=False, separators=(",", ":")))
+        for title, v in values.items()
+    ]
+    with closing(_snapshot_connect()) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)", payloads)
+    return now
+
+
+@st.cache_resource
+def _plan_states() -> dict:
+    """表格 ID -> 刷新状态，进程内共享（脚本每次 rerun 都会重新执行，锁必须放在 cache_resource 里）"""
+    return {}
+
+
+def _refresh_state(spreadsheet_id=SPREADSHEET_ID) -> dict:
+    states = _plan_states()
+    state = states.get(spreadsheet_id)
+    if state is None:
+        state = states.setdefault(spreadsheet_id, {
+            "lock": threading.Lock(),
+            "error": None,
+            "last_attempt": 0.0,
+            "last_seen": 0.0,  # 最近一次有页面访问的时间，预取只关照最近有人看的计划
+            "last_success": None,  # 上次刷新成功的时间
+            "last_duration": None,  # 上次刷新耗时（秒）
+            "lag": 0.0,  # 上次预取比计划晚了多少秒
+            "refreshes": 0,
+            "failures": 0,
+            "consecutive_failures": 0,
+        })
+    return state
+
+
+def _refresh_snapshot(fetcher: _SheetsFetcher, spreadsheet_id: str, state: dict) -> None:
+    if not state["lock"].acquire(blocking=False):
+        return  # 已有刷新在进行
+    try:
+        started = state["last_attempt"] = time.time()
+        values = fetcher.fetch(spreadsheet_id)
+        _track_snapshot_notes(values, spreadsheet_id, _snapshot_write(values, spreadsheet_id))
+        state["error"] = None
+        state["last_success"] = time.time()
+        state["last_duration"] = state["last_success"] - started
+        state["refreshes"] += 1
+        state["consecutive_failures"] = 0
+    except Exception as e:
+        state["error"] = str(e)
+        state["failures"] += 1
+        state["consecutive_failures"] += 1
+        logger.warning(
+            "snapshot refresh of %s failed (%d in a row): %s", spreadsheet_id, state["consecutive_failures"], e,
+        )
+    finally:
+        state["lock"].release()
+
+
+def _refresh_in_background(fetcher: _SheetsFetcher, spreadsheet_id: str) -> None:
+    state = _refresh_state(spreadsheet_id)
+    if state["lock"].locked():
+        return
+    if state["error"] and time.time() - state["last_attempt"] < RETRY_INTERVAL:
+        return
+    threading.Thread(
+        target=_refresh_snapshot, args=(fetcher, spreadsheet_id, state), name="sheet-refresh", daemon=True
+    ).start()
+
+
+def _prefetch_loop(fetcher: _SheetsFetcher, states: dict, stop: threading.Event) -> None:
+    """逐个检查最近有人访问的计划，到点就刷新；快照可能被其它进程刷新过，所以每次醒来都重新读取"""
+    while not stop.is_set():
+        wake = time.time() + PREFETCH_POLL
+        for spreadsheet_id, state in list(states.items()):
+            if time.time() - state["last_seen"] > PLAN_IDLE_TTL:
+                continue
+            try:
+                fetched_at = _snapshot_fetched_at(spreadsheet_id)
+                due = time.time() if fetched_at is None else fetched_at + CACHE_TTL - PREFETCH_LEAD
+                if state["error"]:
+                    due = max(due, state["last_attempt"] + RETRY_INTERVAL)
+                if due > time.time():
+                    wake = min(wake, due)
+                    continue
+                state["lag"] = time.time() - due
+                _refresh_snapshot(fetcher, spreadsheet_id, state)
+                if state["error"] is None:
+                    logger.info(
+                        "prefetch %s ok: lag=%.1fs duration=%.2fs",
+                        spreadsheet_id, state["lag"], state["last_duration"],
+                    )
+            except Exception as e:  # 快照文件读写出错也不能让线程退出
+                logger.warning("prefetch of %s failed: %s", spreadsheet_id, e)
+        stop.wait(max(wake - time.time(), 0))
+
+
+@st.cache_resource(on_release=lambda prefetch: prefetch["stop"].set())
+def _prefetch_scheduler(_gc) -> dict:
+    """每个进程只启动一次的预取线程（负责所有计划）；清空 cache_resource 时随之停止"""
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=_prefetch_loop,
+        args=(_sheets_fetcher(_gc), _plan_states(), stop),
+        name="sheet-prefetch",
+        daemon=True,
+    )
+    thread.start()
+    return {"thread": thread, "stop": stop}
+
+
+def _content_hash(payload) -> str:
+    if not isinstance(payload, str):
+        payload = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _records_nbytes(records: list) -> int:
+    """记录的实际占用：列表 + 每行元组 + 去重后的单元格对象（同一个字符串对象只算一次）"""
+    if not records:
+        return sys.getsizeof(records)
+    cells = {id(v): v for row in records for v in row}
+    return (
+        sys.getsizeof(records) + len(records) * sys.getsizeof(records[0])
+        + sum(map(sys.getsizeof, cells.values()))
+    )
+
+
+def _dataset_nbytes(value) -> int:
+    # 搜索索引的 nbytes 是整数，数据集的是 {部分: 字节}；脚本每次 rerun 都会重新定义类，这里不能用 isinstance
+    nbytes = getattr(value, "nbytes", None)
+    return nbytes if nbytes is not None else sum(value["nbytes"].values())
+
+
+@st.cache_resource
+def _dataset_cache() -> "_LruCache":
+    """规整后的数据集，所有会话、所有计划共用一份，按 (表格, 工作表, 内容哈希) 作键；
+    搜索索引也放在这里，键为 (表格, 工作表, 内容哈希, "search")"""
+    return _LruCache(DATASET_CACHE_MAX_BYTES, _dataset_nbytes)
+
+
+@st.cache_resource
+def _snapshot_hashes() -> dict:
+    """(表格, 工作表) -> (快照时间, 内容哈希)：快照时间没变就不再读 SQLite"""
+    return {}
+
+
+def _normalize_payload(title: str, payload: str, content_hash: str):
+    with stage_timer("parse"):
+        dataset = normalize_sheet(title, _values_to_df(json.loads(payload)))
+    dataset["hash"] = content_hash
+    # 所有会话拿到的是同一个对象，包一层只读视图，防止某个视图顺手改掉别人的数据
+    return MappingProxyType(dataset)
+
+
+def _snapshot_dataset(spreadsheet_id: str, title: str, fetched_at: float) -> dict:
+    """单张工作表的规整结果（见 normalize_sheet）；内容没变就复用，各 tab 只读自己那一张"""
+    hashes = _snapshot_hashes()
+    known = hashes.get((spreadsheet_id, title))
+    payload = None
+    if known is None or known[0] != fetched_at:
+        payload = _snapshot_read_one(spreadsheet_id, title)
+        known = hashes[(spreadsheet_id, title)] = (fetched_at, _content_hash(payload))
+    content_hash = known[1]
+    return _dataset_cache().get_or_render(
+        (spreadsheet_id, title, content_hash),
+        lambda: _normalize_payload(
+            title, payload if payload is not None else _snapshot_read_one(spreadsheet_id, title), content_hash,
+        ),
+    )
 
+
+def ensure_snapshot(_gc, spreadsheet_id=SPREADSHEET_ID) -> float:
+    """确保本地有快照并返回其时间；过期则触发后台刷新。
+
+    只有首次访问某份计划、本地没有快照时才同步请求 Google。
+    """
+    _refresh_state(spreadsheet_id)["last_seen"] = time.time()
+    fetched_at = _snapshot_fetched_at(spreadsheet_id)
+    if fetched_at is None:
+        with stage_timer("sheets/fetch"):
+            values = _sheets_fetcher(_gc).fetch(spreadsheet_id)
+        fetched_at = _snapshot_write(values, spreadsheet_id)
+        _track_snapshot_notes(values, spreadsheet_id, fetched_at)
+    elif time.time() - fetched_at > CACHE_TTL:
+        # 预取正常时不会走到这里；预取关闭或持续失败时由页面访问触发刷新
+        _refresh_in_background(_sheets_fetcher(_gc), spreadsheet_id)
+    return fetched_at
+
+
+def load_dataset(_gc, title, spreadsheet_id=SPREADSHEET_ID) -> dict:
+    return _snapshot_dataset(spreadsheet_id, title, ensure_snapshot(_gc, spreadsheet_id))
+
+
+def load_snapshot(_gc, spreadsheet_id=SPREADSHEET_ID) -> tuple:
+    """返回 ({标题: DataFrame}, {标题: 内容哈希}, 快照时间)"""
+    fetched_at = ensure_snapshot(_gc, spreadsheet_id)
+    frames, hashes = {}, {}
+    for title in SHEET_TITLES:
+        dataset = _snapshot_dataset(spreadsheet_id, title, fetched_at)
+        frames[title], hashes[title] = dataset["frame"], dataset["hash"]
+    return frames, hashes, fetched_at
+
+
+def load_all_sheets(_gc, spreadsheet_id=SPREADSHEET_ID) -> dict:
+    """全部工作表的 DataFrame（来自本地快照，见 load_snapshot）"""
+    return load_snapshot(_gc, spreadsheet_id)[0]
+
+
+def load_sheet(_gc, title, spreadsheet_id=SPREADSHEET_ID):
+    return load_dataset(_gc, title, spreadsheet_id)["frame"]
+
+
+def _format_age(seconds: float) -> str:
+    if seconds < 60:
+        return "刚刚"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} 分钟前"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} 小时前"
+    return f"{int(seconds // 86400)} 天前"
+
+
+def snapshot_caption(fetched_at: float, spreadsheet_id=SPREADSHEET_ID) -> str:
+    text = f"数据来源：Google Sheet · 快照更新于{_format_age(time.time() - fetched_at)}"
+    if _refresh_state(spreadsheet_id)["error"]:
+        text += " · 刷新失败，显示的是缓存数据"
+    return text
+
+
+# ============================================================
+# 训练记录：先写本地队列（SQLite），后台线程定时批量追加到「训练记录」工作表
+# ============================================================
+LOG_SHEET = "训练记录"
+LOG_HEADER = ("记录ID", "记录时间", "日期", "训练日", "动作名称", "组序", "次数", "重量kg", "RPE")
+
+
+def _log_connect() -> sqlite3.Connection:
+    """sent_at 为空表示待同步；lease / leased_until 是发送中的占用标记，attempts 为已开始发送的次数"""
+    os.makedirs(os.path.dirname(SNAPSHOT_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(SNAPSHOT_PATH, timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS log_queue ("
+        "id TEXT PRIMARY KEY, spreadsheet TEXT NOT NULL, date TEXT NOT NULL, day TEXT NOT NULL, "
+        "created_at REAL NOT NULL, payload TEXT NOT NULL, sent_at REAL, lease TEXT, "
+        "leased_until REAL NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, error TEXT)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS log_queue_day ON log_queue (spreadsheet, date, day)")
+    return conn
+
+
+def log_entry_id(spreadsheet_id: str, date: str, day: str, exercise: str, set_no: int) -> str:
+    """同一计划、同一天、同一动作的第几组只有一个 ID：连点两次、发送重试都不会产生重复行"""
+    return _content_hash([spreadsheet_id, date, day, exercise, set_no])[:16]
+
+
+def log_timezone() -> str:
+    """本次会话记录训练用的时区名：FITNESS_TZ > 浏览器时区 > 空（服务器本地时间）"""
+    return LOG_TZ or st.context.timezone or ""
+
+
+def log_clock(tz_name: str, now: float = None) -> tuple:
+    """按 tz_name 换算的 (日期, 记录时间)；时区名为空或无效时用服务器本地时间"""
+    now = time.time() if now is None else now
+    try:
+        moment = datetime.fromtimestamp(now, ZoneInfo(tz_name))
+    except (ZoneInfoNotFoundError, ValueError):
+        moment = datetime.fromtimestamp(now)
+    return moment.strftime("%Y-%m-%d"), moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+@timed("log/enqueue")
+def log_set(spreadsheet_id, day, exercise, set_no, reps, weight, rpe, date=None, tz="") -> bool:
+    """记录一组：只写本地队列，不等 Google；这一组已经记录过时返回 False。
+    日期和记录时间按 tz（时区名）计算：服务器在 UTC 时，UTC+8 早上 8 点前练的组不会记到前一天"""
+    now = time.time()
+    today, logged_at = log_clock(tz, now)
+    date = date or today
+    entry_id = log_entry_id(spreadsheet_id, date, day, exercise, set_no)
+    row = [
+        entry_id, logged_at, date, day, exercise, set_no,
+        "" if reps is None else reps, "" if weight is None else weight, "" if rpe is None else rpe,
+    ]
+    with closing(_log_connect()) as conn, conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO log_queue (id, spreadsheet, date, day, created_at, payload) VALUES (?, ?, ?, ?, ?, ?)",
+            (entry_id, spreadsheet_id, date, day, now, json.dumps(row, ensure_ascii=False)),
+        )
+    return cur.rowcount == 1
+
+
+def logged_sets(spreadsheet_id: str, date: str, day: str) -> list:
+    """某天某个训练日已记录的组：[(表头各列..., 已同步)]，按记录顺序"""
+    with closing(_log_connect()) as conn:
+        rows = conn.execute(
+            "SELECT payload, sent_at IS NOT NULL FROM log_queue WHERE spreadsheet = ? AND date = ? AND day = ? "
+            "ORDER BY created_at",
+            (spreadsheet_id, date, day),
+        ).fetchall()
+    return [(*json.loads(payload), bool(sent)) for payload, sent in rows]
+
+
+def log_queue_status(spreadsheet_id: str) -> dict:
+    """{"pending": 待同步行数, "error": 最近一次写回失败的原因（没有则为 None）}"""
+    with closing(_log_connect()) as conn:
+        pending, error = conn.execute(
+            "SELECT COUNT(*), MAX(error) FROM log_queue WHERE spreadsheet = ? AND sent_at IS NULL", (spreadsheet_id,)
+        ).fetchone()
+    return {"pending": pending, "error": error}
+
+
+class _LogWriter:
+    """后台批量写回：每份计划待同步的记录合成一次 values_append，而不是每记录一组调用一次 API。
+
+    发送前先在 SQLite 里给这批记录加租约，多个进程不会同时发送同一行。之前发送过但没有确认的记录
+    （超时、5xx、进程中途退出，Google 那边可能已经写入），重发前先读一遍「记录ID」列，已存在的直接标记为已同步。
+    失败的记录留在队列里，按指数退避重试，从不丢弃。
+    """
+
+    def __init__(self, fetcher: _SheetsFetcher):
+        self.fetcher = fetcher
+        self.stats = {"flushes": 0, "appended": 0, "deduped": 0, "failures": 0}
+        self._sheets = {}  # 表格 ID -> Spreadsheet（已确认有「训练记录」工作表）
+        self._backoff = {}  # 表格 ID -> (连续失败次数, 下次重试时间)
+        self._lock = threading.Lock()  # 发送期间一直持有（含网络请求）
+        self._stats_lock = threading.Lock()  # 只保护计数，调试面板读计数不用等发送结束
+
+    def _count(self, name: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def stats_snapshot(self) -> dict:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def flush(self) -> int:
+        """发送所有计划中待同步的记录，返回追加的行数；某份计划失败不影响其它计划"""
+        with self._lock:
+            with closing(_log_connect()) as conn:
+                pending = [r[0] for r in conn.execute("SELECT DISTINCT spreadsheet FROM log_queue WHERE sent_at IS NULL")]
+            appended = 0
+            for spreadsheet_id in pending:
+                failures, retry_at = self._backoff.get(spreadsheet_id, (0, 0.0))
+                if time.time() < retry_at:
+                    continue
+                try:
+                    appended += self._flush_one(spreadsheet_id)
+                    self._backoff.pop(spreadsheet_id, None)
+                except Exception as e:
+                    self._count("failures")
+                    delay = min(LOG_FLUSH_INTERVAL * 2 ** failures, LOG_RETRY_CAP) * random.uniform(0.5, 1)
+                    self._backoff[spreadsheet_id] = (failures + 1, time.time() + delay)
+                    logger.warning(
+                        "workout log flush of %s failed (%d in a row), retry in %.0fs: %s",
+                        spreadsheet_id, failures + 1, delay, e,
+                    )
+            return appended
+
+    def _flush_one(self, spreadsheet_id: str) -> int:
+        appended = 0
+        while True:
+            lease, batch = self._lease(spreadsheet_id)
+            if not batch:
+                return appended
+            try:
+                sh = self._spreadsheet(spreadsheet_id)
+                if any(attempts > 1 for _, _, attempts in batch):
+                    existing = self._remote_ids(sh)
+                    dup = [entry_id for entry_id, _, _ in batch if entry_id in existing]
+                    batch = [b for b in batch if b[0] not in existing]
+                    self._mark_sent(dup)
+                    self._count("deduped", len(dup))
+                if batch:
+                    self.fetcher._acquire_quota(1, "write")
+                    sh.values_append(
+                        _a1_sheet(LOG_SHEET),
+                        {"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+                        {"values": [json.loads(payload) for _, payload, _ in batch]},
+                    )
+                    self._mark_sent([entry_id for entry_id, _, _ in batch])
+                    self._count("flushes")
+                    self._count("appended", len(batch))
+                    appended += len(batch)
+            except Exception as e:
+                self._release(lease, str(e))
+                raise
+            if len(batch) < LOG_BATCH_MAX:
+                return appended
+
+    def _lease(self, spreadsheet_id: str) -> tuple:
+        """用一条 UPDATE 占用最多 LOG_BATCH_MAX 条待同步记录（SQLite 写锁保证多进程互斥），返回 (租约, [(ID, 行, 次数)])"""
+        lease, now = os.urandom(8).hex(), time.time()
+        with closing(_log_connect()) as conn, conn:
+            conn.execute(
+                "UPDATE log_queue SET lease = ?, leased_until = ?, attempts = attempts + 1 WHERE id IN ("
+                "SELECT id FROM log_queue WHERE spreadsheet = ? AND sent_at IS NULL AND leased_until < ? "
+                "ORDER BY created_at LIMIT ?)",
+                (lease, now + LOG_LEASE, spreadsheet_id, now, LOG_BATCH_MAX),
+            )
+            batch = conn.execute(
+                "SELECT id, payload, attempts FROM log_queue WHERE lease = ? ORDER BY created_at", (lease,)
+            ).fetchall()
+        return lease, batch
+
+    def _mark_sent(self, ids: list):
+        if ids:
+            with closing(_log_connect()) as conn, conn:
+                conn.executemany(
+                    "UPDATE log_queue SET sent_at = ?, error = NULL WHERE id = ?", [(time.time(), i) for i in ids]
+                )
+
+    def _release(self, lease: str, error: str):
+        with closing(_log_connect()) as conn, conn:
+            conn.execute(
+                "UPDATE log_queue SET leased_until = 0, error = ? WHERE lease = ? AND sent_at IS NULL", (error, lease)
+            )
+
+    def _spreadsheet(self, spreadsheet_id: str):
+        """打开表格并确保有「训练记录」工作表（没有就新建并写表头）；每个进程每份计划只做一次"""
+        sh = self._sheets.get(spreadsheet_id)
+        if sh is None:
+            self.fetcher._acquire_quota(API_CALLS_PER_FETCH)
+            sh = self.fetcher.gc.open_by_key(spreadsheet_id)
+            from gspread.exceptions import WorksheetNotFound  # 客户端已创建，gspread 已经导入
+
+            try:
+                sh.worksheet(LOG_SHEET)
+            except WorksheetNotFound:
+                self.fetcher._acquire_quota(2, "write")  # 新建工作表 + 写表头
+                sh.add_worksheet(LOG_SHEET, rows=1, cols=len(LOG_HEADER))
+                sh.values_append(_a1_sheet(LOG_SHEET), {"valueInputOption": "RAW"}, {"values": [list(LOG_HEADER)]})
+            self._sheets[spreadsheet_id] = sh
+        return sh
+
+    def _remote_ids(self, sh) -> set:
+        self.fetcher._acquire_quota(1)
+        resp = sh.values_get(f"{_a1_sheet(LOG_SHEET)}!A:A")
+        return {row[0] for row in resp.get("values", []) if row}
+
+
+def _log_flush_loop(writer: _LogWriter, stop: threading.Event) -> None:
+    """启动时先发送上次进程留下的记录，之后每 LOG_FLUSH_INTERVAL 秒一次"""
+    while True:
+        try:
+            writer.flush()
+        except Exception as e:  # 队列文件读写出错也不能让线程退出
+            logger.warning("workout log flush failed: %s", e)
+        if stop.wait(LOG_FLUSH_INTERVAL):
+            return
+
+
+@st.cache_resource(on_release=lambda log: log["stop"].set())
+def _log_scheduler(_gc) -> dict:
+    """每个进程只启动一次的写回线程（负责所有计划）；清空 cache_resource 时随之停止"""
+    writer = _LogWriter(_sheets_fetcher(_gc))
+    stop = threading.Event()
+    thread = threading.Thread(target=_log_flush_loop, args=(writer, stop), name="workout-log", daemon=True)
+    thread.start()
+    return {"writer": writer, "thread": thread, "stop": stop}
+
+
+# ============================================================
+# 训练进度：日 / 周汇总物化在 SQLite 里，每次只并入新增的记录
+# ============================================================
+PROGRESS_PERIODS = {"week": "按周", "day": "按天"}
+NOTE_OBSERVING, NOTE_RESOLVED = "观察中", "已修正"
+NOTE_REMOVED = "已删除"  # 从表里删掉的问题：不再算「仍在观察」，已记下的修正用时保留
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_rollup (
+    spreadsheet TEXT NOT NULL, period TEXT NOT NULL, start TEXT NOT NULL, exercise TEXT NOT NULL,
+    sets INTEGER NOT NULL, reps REAL NOT NULL, volume REAL NOT NULL, top_weight REAL,
+    rpe_sum REAL NOT NULL, rpe_n INTEGER NOT NULL,
+    PRIMARY KEY (spreadsheet, exercise, period, start)
+);
+CREATE TABLE IF NOT EXISTS rollup_state (
+    spreadsheet TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (spreadsheet, name)
+);
+CREATE TABLE IF NOT EXISTS note_status (
+    spreadsheet TEXT NOT NULL, key TEXT NOT NULL, exercise TEXT NOT NULL, status TEXT NOT NULL,
+    observing_since REAL, resolved_at REAL, PRIMARY KEY (spreadsheet, key)
+);
+CREATE INDEX IF NOT EXISTS note_status_exercise ON note_status (spreadsheet, exercise);
+CREATE TABLE IF NOT EXISTS note_rollup (
+    spreadsheet TEXT NOT NULL, exercise TEXT NOT NULL, resolved INTEGER NOT NULL, days_sum REAL NOT NULL,
+    days_max REAL, observing INTEGER NOT NULL, oldest_since REAL, PRIMARY KEY (spreadsheet, exercise)
+);
+"""
+_ROLLUP_UPSERT = (
+    "INSERT INTO log_rollup VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (spreadsheet, exercise, period, start) DO UPDATE SET "
+    "sets = sets + excluded.sets, reps = reps + excluded.reps, volume = volume + excluded.volume, "
+    "top_weight = MAX(COALESCE(top_weight, excluded.top_weight), COALESCE(excluded.top_weight, top_weight)), "
+    "rpe_sum = rpe_sum + excluded.rpe_sum, rpe_n = rpe_n + excluded.rpe_n"
+)
+_NOTE_ROLLUP = (
+    "INSERT OR REPLACE INTO note_rollup SELECT spreadsheet, exercise, COUNT(resolved_at), "
+    "COALESCE(SUM(resolved_at - observing_since), 0) / 86400, MAX(resolved_at - observing_since) / 86400, "
+    "COUNT(CASE WHEN status = ? AND resolved_at IS NULL THEN 1 END), "
+    "MIN(CASE WHEN status = ? AND resolved_at IS NULL THEN observing_since END) "
+    "FROM note_status WHERE spreadsheet = ? AND exercise = ? GROUP BY spreadsheet, exercise"
+)
+
+
+def _rollup_connect() -> sqlite3.Connection:
+    conn = _log_connect()
+    conn.executescript(ROLLUP_SCHEMA)
+    return conn
+
+
+def _state_get(conn, spreadsheet_id: str, name: str, default=None):
+    row = conn.execute(
+        "SELECT value FROM rollup_state WHERE spreadsheet = ? AND name = ?", (spreadsheet_id, name)
+    ).fetchone()
+    return row[0] if row else default
+
+
+def _state_set(conn, spreadsheet_id: str, name: str, value):
+    conn.execute("INSERT OR REPLACE INTO rollup_state VALUES (?, ?, ?)", (spreadsheet_id, name, str(value)))
+
+
+def _sql_rows(df: pd.DataFrame) -> list:
+    """DataFrame → executemany 参数，NaN 写成 NULL"""
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def _aggregate_sets(entries: pd.DataFrame) -> pd.DataFrame:
+    """新增的记录（列同 LOG_HEADER）→ 日、周两级汇总，列顺序与 log_rollup 一致（不含表格 ID）"""
+    reps = pd.to_numeric(entries["次数"], errors="coerce")
+    weight = pd.to_numeric(entries["重量kg"], errors="coerce")
+    rpe = pd.to_numeric(entries["RPE"], errors="coerce")
+    dates = pd.to_datetime(entries["日期"], errors="coerce")
+    base = pd.DataFrame({
+        "exercise": entries["动作名称"],
+        "day": dates.dt.strftime("%Y-%m-%d"),
+        "week": (dates - pd.to_timedelta(dates.dt.dayofweek, unit="D")).dt.strftime("%Y-%m-%d"),  # 周一
+        "reps": reps.fillna(0),
+        "volume": (reps * weight).fillna(0),
+        "top_weight": weight,
+        "rpe_sum": rpe.fillna(0),
+        "rpe_n": rpe.notna().astype(int),
+    })[dates.notna()]
+    parts = []
+    for period in PROGRESS_PERIODS:
+        grouped = base.groupby([period, "exercise"], sort=False)
+        sums = grouped[["reps", "volume", "rpe_sum", "rpe_n"]].sum()
+        sums["sets"], sums["top_weight"] = grouped.size(), grouped["top_weight"].max()
+        parts.append(sums.reset_index().rename(columns={period: "start"}).assign(period=period))
+    columns = ["period", "start", "exercise", "sets", "reps", "volume", "top_weight", "rpe_sum", "rpe_n"]
+    return pd.concat(parts)[columns]
+
+
+@timed("progress/rollup")
+def update_log_rollups(spreadsheet_id: str, fetcher=None) -> int:
+    """把水位线（log_queue 的 rowid）之后新增的该计划记录并入日 / 周汇总，返回并入的行数。
+
+    记录只增不改，所以汇总可以直接累加；没有新记录时只做一次只读查询。
+    本地还没有水位线（第一次汇总，或重新部署后 .cache 被清空）且传了 fetcher 时，先读一遍「训练记录」工作表
+    作为历史，本地队列里表上还没有的记录再并进去；读表失败时这次不汇总，下次进入页面再试。
+    """
+    with closing(_rollup_connect()) as conn:
+        # 水位线按整张队列的 rowid 记：MAX(rowid) 是 O(1)，新记录的查询也只扫水位线之后的那一段
+        latest = conn.execute("SELECT MAX(rowid) FROM log_queue").fetchone()[0]
+        mark = _state_get(conn, spreadsheet_id, "log_rowid")
+        if mark is not None and (latest is None or latest <= int(mark)):
+            return 0
+        remote = None
+        if mark is None and fetcher is not None:
+            try:
+                remote = _remote_log_entries(fetcher, spreadsheet_id)  # 网络请求放在写事务之外
+            except Exception as e:
+                logger.warning("workout log history of %s unavailable, rollup skipped: %s", spreadsheet_id, e)
+                return 0
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")  # 水位线和汇总在同一个写事务里，多进程不会重复累加
+            mark = _state_get(conn, spreadsheet_id, "log_rowid")
+            latest = conn.execute("SELECT MAX(rowid) FROM log_queue").fetchone()[0] or 0
+            rows = conn.execute(
+                # +spreadsheet：不走 (spreadsheet, ...) 索引，按 rowid 区间扫描
+                "SELECT payload FROM log_queue WHERE rowid > ? AND rowid <= ? AND +spreadsheet = ? ORDER BY rowid",
+                (int(mark or 0), latest, spreadsheet_id),
+            ).fetchall()
+            entries = pd.DataFrame([json.loads(r[0]) for r in rows], columns=list(LOG_HEADER))
+            if mark is None and remote is not None:
+                # 已经写回表上的记录以表为准，只补上还没同步的
+                entries = pd.concat([remote, entries[~entries["记录ID"].isin(remote["记录ID"])]], ignore_index=True)
+            if len(entries):
+                conn.executemany(_ROLLUP_UPSERT, [(spreadsheet_id, *r) for r in _sql_rows(_aggregate_sets(entries))])
+            _state_set(conn, spreadsheet_id, "log_rowid", latest)
+    return len(entries)
+
+
+def _remote_log_entries(fetcher, spreadsheet_id: str) -> pd.DataFrame:
+    """「训练记录」工作表里的记录（列同 LOG_HEADER）；还没有这张工作表时是空表"""
+    fetcher._acquire_quota(API_CALLS_PER_FETCH)  # open_by_key + worksheet 各读一次元数据
+    sh = fetcher.gc.open_by_key(spreadsheet_id)
+    from gspread.exceptions import WorksheetNotFound  # 客户端已创建，gspread 已经导入
+
+    try:
+        sh.worksheet(LOG_SHEET)
+    except WorksheetNotFound:
+        return pd.DataFrame(columns=list(LOG_HEADER))
+    fetcher._acquire_quota(1)
+    values = sh.values_get(_a1_sheet(LOG_SHEET)).get("values", [])
+    width = len(LOG_HEADER)
+    rows = [(row + [""] * width)[:width] for row in values if row and row[0] != LOG_HEADER[0]]
+    return pd.DataFrame(rows, columns=list(LOG_HEADER))
+
+
+def _note_keys(frame: pd.DataFrame) -> pd.Series:
+    """训练笔记没有 ID 列：日期 + 动作名称 + 问题发现 标识一条问题"""
+    return frame["日期"].astype(str) + "\x1f" + frame["动作名称"].astype(str) + "\x1f" + frame["问题发现"].astype(str)
+
+
+def _edited_notes(missing: pd.Series, added: pd.Series) -> dict:
+    """消失的键 -> 新出现的键：日期 + 动作名称 相同、两边都只有一条时，当作改了问题描述的同一条笔记"""
+    if missing.empty or added.empty:
+        return {}
+
+    def by_prefix(keys):
+        prefix = keys.str.rpartition("\x1f")[0]
+        return pd.Series(keys.to_numpy(), index=prefix.to_numpy())[~prefix.duplicated(keep=False).to_numpy()]
+
+    old, new = by_prefix(missing), by_prefix(added)
+    common = old.index.intersection(new.index)
+    return dict(zip(old[common], new[common]))
+
+
+@timed("progress/notes")
+def track_note_status(spreadsheet_id: str, frame: pd.DataFrame, content_hash: str, seen_at: float) -> int:
+    """训练笔记内容变化时调用：记下每条问题进入「观察中」的时间和第一次变成「已修正」的时间，返回状态变化的条数。
+
+    表里只有当前状态，变化要靠比较前后两次快照；开始时间取笔记的日期，解析不了时取第一次看到「观察中」的快照时间。
+    只改了问题描述的笔记沿用原来的观察 / 修正时间（见 _edited_notes）；从表里删掉的标记为「已删除」；
+    已修正的问题被改回其它状态时清掉修正时间，改回「观察中」的从这次快照重新开始计时。
+    同一份内容只处理一次，只写状态有变化的行，再重算受影响动作的汇总。
+    """
+    if not {"日期", "动作名称", "问题发现", "状态"} <= set(frame.columns):
+        return 0
+    with closing(_rollup_connect()) as conn:
+        if _state_get(conn, spreadsheet_id, "notes_hash") == content_hash:
+            return 0
+        noted = pd.to_datetime(frame["日期"].astype(str), errors="coerce")
+        current = pd.DataFrame({
+            "key": _note_keys(frame),
+            "exercise": frame["动作名称"].astype(str),
+            "status": frame["状态"].astype(str),
+            "start": (noted - pd.Timestamp(0)) / pd.Timedelta(seconds=1),  # unix 秒，NaT 为 NaN
+        }).drop_duplicates("key", keep="last")
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if _state_get(conn, spreadsheet_id, "notes_hash") == content_hash:
+                return 0  # 别的进程刚处理过同一份内容
+            known = pd.read_sql_query(
+                "SELECT key, exercise, status AS known, observing_since, resolved_at FROM note_status "
+                "WHERE spreadsheet = ?",
+                conn, params=(spreadsheet_id,), dtype={"observing_since": float, "resolved_at": float},
+            )
+            # 反连接：表里已经没有的键，要么是改了描述（换成新键），要么是删掉了
+            listed = known["key"].isin(current["key"])
+            missing = known[~listed & known["known"].ne(NOTE_REMOVED)]
+            edited = _edited_notes(missing["key"], current.loc[~current["key"].isin(known["key"]), "key"])
+            removed = missing[~missing["key"].isin(edited)]
+            known = known[listed | known["key"].isin(edited)].replace({"key": edited})
+            changed = current.merge(known.drop(columns="exercise"), on="key", how="left")
+            changed = changed[changed["known"].ne(changed["status"]) | changed["key"].isin(edited.values())]
+            start = changed["start"].where(changed["start"] <= seen_at, seen_at)
+            observing, fixed = changed["status"].eq(NOTE_OBSERVING), changed["status"].eq(NOTE_RESOLVED)
+            # 修正后又改回别的状态（重新打开）：清掉修正时间，回到「观察中」的从这次快照重新计时
+            reopened = changed["resolved_at"].notna() & ~fixed
+            since = changed["observing_since"].mask(reopened, seen_at).where(~reopened | observing)
+            since = since.fillna(start.where(observing & ~reopened))
+            resolved = changed["resolved_at"].where(fixed).fillna(
+                pd.Series(seen_at, index=changed.index).where(fixed & since.notna())
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO note_status VALUES (?, ?, ?, ?, ?, ?)",
+                _sql_rows(pd.DataFrame({
+                    "spreadsheet": spreadsheet_id, "key": changed["key"], "exercise": changed["exercise"],
+                    "status": changed["status"], "observing_since": since, "resolved_at": resolved,
+                })),
+            )
+            conn.executemany(
+                "DELETE FROM note_status WHERE spreadsheet = ? AND key = ?", [(spreadsheet_id, k) for k in edited],
+            )
+            conn.executemany(
+                "UPDATE note_status SET status = ? WHERE spreadsheet = ? AND key = ?",
+                [(NOTE_REMOVED, spreadsheet_id, k) for k in removed["key"]],
+            )
+            # 消失的键（改了描述或删掉）所在动作也要重算，否则它们一直算作「仍在观察」
+            exercises = pd.concat([changed["exercise"], missing["exercise"]]).unique()
+            conn.executemany(_NOTE_ROLLUP, [(NOTE_OBSERVING, NOTE_OBSERVING, spreadsheet_id, e) for e in exercises])
+            _state_set(conn, spreadsheet_id, "notes_hash", content_hash)
+    return len(changed) + len(removed)
+
+
+def _track_snapshot_notes(values: dict, spreadsheet_id: str, fetched_at: float) -> None:
+    """拉到新快照后顺带跟踪训练笔记状态，没人打开进度页时也能记下修正时间；出错只记日志"""
+    notes = values.get("训练笔记")
+    if not notes:
+        return
+    try:
+        track_note_status(spreadsheet_id, _values_to_df(notes), _content_hash(notes), fetched_at)
+    except Exception as e:
+        logger.warning("note status tracking of %s failed: %s", spreadsheet_id, e)
+
+
+def progress_exercises(spreadsheet_id: str) -> list:
+    """有记录的动作，最近练过的在前"""
+    with closing(_rollup_connect()) as conn:
+        rows = conn.execute(
+            "SELECT exercise FROM log_rollup WHERE spreadsheet = ? AND period = 'week' "
+            "GROUP BY exercise ORDER BY MAX(start) DESC, exercise",
+            (spreadsheet_id,),
+        ).fetchall()
+    return [r[0] for r in rows]
+
+
+def progress_trend(spreadsheet_id: str, exercise: str, period: str = "week") -> pd.DataFrame:
+    """某个动作按天 / 按周的趋势：组数、次数、训练量（次数 × 重量）、最大重量、平均 RPE 及较上期的变化"""
+    with closing(_rollup_connect()) as conn:
+        df = pd.read_sql_query(
+            "SELECT start, sets, reps, volume, top_weight, rpe_sum, rpe_n FROM log_rollup "
+            "WHERE spreadsheet = ? AND exercise = ? AND period = ? ORDER BY start",
+            conn, params=(spreadsheet_id, exercise, period),
+            dtype={"top_weight": float},  # 整列都是 NULL 时 SQLite 读出来是 object
+        )
+    rpe = (df["rpe_sum"] / df["rpe_n"].where(df["rpe_n"] > 0)).round(2)
+    return pd.DataFrame({
+        "周起始" if period == "week" else "日期": df["start"],
+        "组数": df["sets"],
+        "次数": df["reps"].astype(int),
+        "训练量 kg": df["volume"].round(1),
+        "最大重量 kg": df["top_weight"],
+        "平均 RPE": rpe,
+        "RPE 变化": rpe.diff().round(2),
+    })
+
+
+def note_durations(spreadsheet_id: str) -> pd.DataFrame:
+    """每个动作的问题从「观察中」到「已修正」用了多少天，以及仍在观察中的问题"""
+    with closing(_rollup_connect()) as conn:
+        df = pd.read_sql_query(
+            "SELECT exercise, resolved, days_sum, days_max, observing, oldest_since FROM note_rollup "
+            "WHERE spreadsheet = ? AND (resolved > 0 OR observing > 0) ORDER BY resolved DESC, observing DESC",
+            conn, params=(spreadsheet_id,),
+            dtype={"days_max": float, "oldest_since": float},  # 整列都是 NULL 时 SQLite 读出来是 object
+        )
+    return pd.DataFrame({
+        "动作名称": df["exercise"],
+        "已修正": df["resolved"],
+        "平均天数": (df["days_sum"] / df["resolved"].where(df["resolved"] > 0)).round(1),
+        "最长天数": df["days_max"].round(1),
+        "仍在观察": df["observing"],
+        "最久观察天数": ((time.time() - df["oldest_since"]) / 86400).round(1),
+    })
+
+
+# ============================================================
+# 数据规整：每次拉取后执行一次，结果与数据一起缓存
+# ============================================================
+GROUPED_SHEETS = ("周训练计划", "身体状况与禁忌")  # 首列是合并单元格，需要向下填充并分组
+
+
+# 取值只有几种、却每行都重复的列：存成 category（整数编码 + 一份取值表）
+CATEGORICAL_COLUMNS = ("训练日", "阶段", "动作类型", "类别", "优先级", "状态")
+
+
+# 规整时把文本解析成数值列，渲染和筛选直接读数值，不再每次做字符串匹配
+RPE_HIGH_MIN = 7  # RPE 下限 ≥ 7 为高强度（"7-8"、"8"；"6-7"、"4-7" 不算）
+RPE_LOW_MAX = 6  # RPE 上限 ≤ 6 为低强度（"4-5"、"5-6"）
+# "8"、"7-8"、"7.5～8.5"；取第一个数字 / 区间，超过 10 的视为无效
+RPE_PATTERN = r"(\d+(?:\.\d+)?)(?:\s*[-~～–—至到]\s*(\d+(?:\.\d+)?))?"
+# "4x10"、"3×8-12"、"3-4x8"、"3组x每侧10次"；组数 x 次数（组数、次数的区间都取下限），
+# 次数后跟秒 / 分钟的是计时动作，不计次数
+SETS_REPS_PATTERN = r"(\d+)(?:\s*[-~～–—]\s*\d+)?\s*组?\s*[xX×*]\s*(?:每[侧边])?\s*(\d+)(?:\s*[-~～–—]\s*\d+)?\s*(秒|s\b|分钟|min)?"
+TYPED_COLUMNS = ("RPE下限", "RPE上限", "强度", "组数", "次数", "训练量")
+
+
+def parse_rpe(values: pd.Series) -> pd.DataFrame:
+    """目标RPE → RPE下限 / RPE上限 / 强度（"high"、"low" 或 ""）；向量化，解析不出的为 NaN"""
+    parts = values.astype(str).str.extract(RPE_PATTERN).astype(float)
+    low, high = parts[0], parts[1].fillna(parts[0])
+    valid = (low <= high) & (high <= 10)
+    low, high = low.where(valid), high.where(valid)
+    level = np.select([low >= RPE_HIGH_MIN, high <= RPE_LOW_MAX], ["high", "low"], "")
+    return pd.DataFrame({"RPE下限": low, "RPE上限": high, "强度": level}, index=values.index)
+
+
+def parse_sets_reps(values: pd.Series) -> pd.DataFrame:
+    """组数x次数 → 组数 / 次数 / 训练量（组数 × 次数）；计时动作只有组数"""
+    parts = values.astype(str).str.extract(SETS_REPS_PATTERN)
+    sets = parts[0].astype(float)
+    reps = parts[1].astype(float).where(parts[2].isna())
+    return pd.DataFrame({"组数": sets, "次数": reps, "训练量": sets * reps}, index=values.index)
+
+
+def _parse_distinct(values: pd.Series, parse) -> pd.DataFrame:
+    """这两列只有几十种不同写法：只解析不同的取值，再按编码铺回每一行"""
+    codes, uniques = pd.factorize(values)
+    parsed = parse(pd.Series(uniques, dtype=object))
+    return parsed.iloc[codes].set_axis(values.index)
+
+
+def _typed_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """表中有 目标RPE / 组数x次数 时解析出 TYPED_COLUMNS 中对应的列，与 frame 按行对齐"""
+    parsed = []
+    if "目标RPE" in df.columns:
+        parsed.append(_parse_distinct(df["目标RPE"], parse_rpe))
+    if "组数x次数" in df.columns:
+        parsed.append(_parse_distinct(df["组数x次数"], parse_sets_reps))
+    if not parsed:
+        return pd.DataFrame(index=df.index)
+    typed = pd.concat(parsed, axis=1)
+    if "强度" in typed.columns:
+        typed["强度"] = typed["强度"].astype("category")
+    return typed
+
+
+def _day_totals(typed: pd.DataFrame, key: pd.Series) -> dict:
+    """{首列取值: {"动作": 有组数的行数, "组数": 总组数, "训练量": 总次数}}"""
+    if "组数" not in typed.columns:
+        return {}
+    grouped = typed[["组数", "训练量"]].groupby(key, sort=False, observed=True)
+    sums, counts = grouped.sum(), grouped["组数"].count()
+    return {
+        k: {"动作": int(counts[k]), "组数": int(sums.at[k, "组数"]), "训练量": int(sums.at[k, "训练量"])}
+        for k in sums.index
+    }
+
+
+def _ffill_first_col(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df.iloc[:, 0] = df.iloc[:, 0].replace("", pd.NA).ffill().fillna("")
+    return df
+
+
+def _group_positions(df: pd.DataFrame) -> list:
+    """一次 groupby 得到 [(首列取值, 行号列表)]，按首次出现的顺序"""
+    indices = df.groupby(df.iloc[:, 0], sort=False, observed=True).indices
+    return sorted(((key, idx.tolist()) for key, idx in indices.items()), key=lambda kv: kv[1][0])
+
+
+def _compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    categorical = {c: "category" for c in CATEGORICAL_COLUMNS if c in df.columns}
+    return df.astype(categorical) if categorical else df
+
+
+def _interned_records(df: pd.DataFrame) -> list:
+    """逐列取值并去重：相同文本在所有行里共用一个字符串对象"""
+    memo = {}
+    columns = [[memo.setdefault(v, v) for v in df.iloc[:, j].tolist()] for j in range(df.shape[1])]
+    return list(zip(*columns)) if columns else [() for _ in range(len(df))]
+
+
+def normalize_sheet(title: str, df: pd.DataFrame) -> dict:
+    """把一张工作表整理成可直接渲染的数据：
+
+    - frame：DataFrame（分组表的首列已向下填充，重复取值多的列为 category）
+    - typed：从文本解析出的数值列（见 TYPED_COLUMNS），与 frame 按行对齐
+    - header / cols：表头元组及 {列名: 位置}；cols 也包含 typed 的列
+    - records：每行一个元组（表头各列 + typed 各列），相同文本共用同一个字符串对象
+    - groups：{首列取值: {"index": 行号列表, "hash": 内容哈希, "totals": 训练量合计}}（仅分组表）
+    - nbytes：{"frame": 字节, "typed": 字节, "records": 字节}，规整时实测
+
+    结果在进程内共享、只读：视图里的筛选 / 切片在 pandas 写时复制下不会复制或改动这份数据。
+    """
+    grouped = title in GROUPED_SHEETS and not df.empty
+    if grouped:
+        df = _ffill_first_col(df)
+    df = _compact_frame(df)
+    typed = _typed_columns(df)
+    header = tuple(df.columns)
+    records = _interned_records(pd.concat([df, typed], axis=1) if len(typed.columns) else df)
+    groups = {}
+    if grouped:
+        totals = _day_totals(typed, df.iloc[:, 0])
+        for key, idx in _group_positions(df):
+            groups[key] = {
+                "index": idx,
+                "hash": _content_hash([header, [records[i] for i in idx]]),
+                "totals": totals.get(key),
+            }
+    return {
+        "frame": df,
+        "typed": typed,
+        "header": header,
+        # 重复列名时与 header.index() 一样取第一个
+        "cols": {name: i for i, name in reversed(list(enumerate(header + tuple(typed.columns))))},
+        "records": records,
+        "groups": groups,
+        "nbytes": {
+            "frame": int(df.memory_usage(deep=True).sum()),
+            "typed": int(typed.memory_usage(deep=True).sum()),
+            "records": _records_nbytes(records),
+        },
+    }
+
+
+def dataset_memory_report(spreadsheet_id=SPREADSHEET_ID) -> list:
+    """数据集缓存中该计划各工作表的实测内存：[(工作表, 行数, 表格 KB, 解析列 KB, 记录 KB, 索引 KB, category 列)]"""
+    entries = [(key, value) for key, value in _dataset_cache().entries() if key[0] == spreadsheet_id]
+    indexes = {key[:3]: value.nbytes for key, value in entries if len(key) == 4}
+    report = []
+    for key, dataset in entries:
+        if len(key) == 4:
+            continue
+        frame, nbytes = dataset["frame"], dataset["nbytes"]
+        categorical = [c for c in frame.columns if isinstance(frame[c].dtype, pd.CategoricalDtype)]
+        report.append((
+            key[1], len(frame), round(nbytes["frame"] / 1024, 1), round(nbytes["typed"] / 1024, 1),
+            round(nbytes["records"] / 1024, 1), round(indexes.get(key, 0) / 1024, 1), "、".join(categorical),
+        ))
+    return sorted(report, key=lambda r: SHEET_TITLES.index(r[0]))
+
+
+def group_rows(dataset: dict, key) -> list:
+    return [dataset["records"][i] for i in dataset["groups"][key]["index"]]
+
+
+def high_intensity(dataset, positions) -> list:
+    """positions（行号列表）中 RPE 下限 ≥ RPE_HIGH_MIN 的行号，直接比较规整时解析好的数值列"""
+    low = dataset["typed"]["RPE下限"].to_numpy()
+    idx = np.asarray(positions, dtype=np.intp)
+    return idx[low[idx] >= RPE_HIGH_MIN].tolist()
+
+
+def totals_caption(totals) -> str:
+    if not totals:
+        return ""
+    return f"{totals['动作']} 个动作 · 共 {totals['组数']} 组 · 训练量 {totals['训练量']} 次"
+
+
+@timed("get_day_data")
 def get_day_data(df):
     """将周训练计划按训练日分组"""
-    df.iloc[:, 0] = df.iloc[:, 0].replace("", pd.NA).ffill().fillna("")
-    days = df.iloc[:, 0].unique().tolist()
-    return {day: df[df.iloc[:, 0] == day].reset_index(drop=True) for day in days}
+    df = _ffill_first_col(df)
+    return {day: df.iloc[idx].reset_index(drop=True) for day, idx in _group_positions(df)}
+
+
+def _field(row, cols: dict, name: str):
+    i = cols.get(name)
+    return row[i] if i is not None else ""
+
+
+def paginate(total: int, key: str, reset_on=None) -> tuple:
+    """分页：返回当前页的 (起, 止)。超过一页时显示页码；reset_on（如筛选条件）变化时回到第 1 页"""
+    n_pages = max(-(-total // PAGE_SIZE), 1)
+    if n_pages == 1:
+        return 0, total
+    marker = key + "/reset_on"
+    if st.session_state.get(marker) != reset_on or st.session_state.get(key, 1) > n_pages:
+        st.session_state[key] = 1
+    st.session_state[marker] = reset_on
+    page = st.number_input(f"页码（共 {n_pages} 页）", min_value=1, max_value=n_pages, step=1, key=key)
+    start = (page - 1) * PAGE_SIZE
+    return start, min(start + PAGE_SIZE, total)
+
+
+def page_caption(text: str, total: int, start: int, stop: int) -> str:
+    """在"共 N 条"的总数说明后加上当前页范围"""
+    if stop - start == total:
+        return text
+    return f"{text} · 第 {start + 1}–{stop} 条"
+
+
+def _select_rows(records: list, mask) -> list:
+    """按布尔掩码（与 frame 行对齐）挑出对应的记录"""
+    return [row for row, keep in zip(records, mask.tolist()) if keep]
+
+
+# ============================================================
+# 全文搜索：倒排索引，中文按单字 + 相邻二字切分，英文按词前缀匹配，按内容哈希缓存
+# ============================================================
+SEARCH_FIELDS = {  # 工作表 -> [(列名, 权重)]
+    "动作库": (("动作名称", 3), ("目标肌群", 2), ("道长专属注意事项", 1)),
+    "训练笔记": (("动作名称", 3), ("问题发现", 2), ("修正建议", 1)),
+}
+_TOKEN_RUN = re.compile(r"[\u4e00-\u9fff]+|[a-z0-9]+")
+
+
+def _index_tokens(text: str) -> list:
+    """索引用：中文连续段切成单字和二字，字母数字按整词"""
+    tokens = []
+    for run in _TOKEN_RUN.findall(text.lower()):
+        if run.isascii():
+            tokens.append(run)
+        else:
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _query_tokens(query: str) -> set:
+    """查询用：中文段长度 ≥ 2 时只用二字（更准），单字才用单字；只有标点、emoji 时返回空集合（不筛选）"""
+    tokens = set()
+    for run in _TOKEN_RUN.findall(query.lower()):
+        if run.isascii() or len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class _SearchIndex:
+    """词 -> (行号数组, 权重数组)；查询时所有词都要命中（AND），按 tf-idf 排序。
+
+    含字母的英文词按前缀匹配（边输入边搜，"squ" 命中 "squat"）；纯数字和中文按整词匹配。
+    """
+
+    def __init__(self, frame: pd.DataFrame, fields):
+        self.n_rows = len(frame)
+        postings = {}
+        for col, weight in fields:
+            if col not in frame.columns:
+                continue
+            for row, text in enumerate(frame[col].tolist()):
+                for token in _index_tokens(str(text)):
+                    posting = postings.get(token)
+                    if posting is None:
+                        posting = postings[token] = {}
+                    posting[row] = posting.get(row, 0) + weight
+        # 转成按行号排序的 numpy 数组并预乘 idf，查询只剩几次向量运算
+        self.postings = {}
+        for token, posting in postings.items():
+            idf = math.log(1 + self.n_rows / len(posting))
+            rows = np.fromiter(posting.keys(), dtype=np.int32, count=len(posting))
+            weights = np.fromiter(posting.values(), dtype=np.float32, count=len(posting)) * idf
+            order = np.argsort(rows, kind="stable")
+            self.postings[token] = (rows[order], weights[order])
+        self._latin = sorted(t for t in self.postings if _is_prefix_token(t))  # 前缀查找用的有序词表
+        self.nbytes = sys.getsizeof(self.postings) + sys.getsizeof(self._latin) + sum(
+            sys.getsizeof(token) + sys.getsizeof(posting) + posting[0].nbytes + posting[1].nbytes
+            for token, posting in self.postings.items()
+        )
+
+    def _posting(self, token: str) -> tuple:
+        """查询词的倒排表；英文词合并所有以它开头的词，同一行取最高的权重"""
+        if not _is_prefix_token(token):
+            return self.postings.get(token, (_EMPTY_ROWS, None))
+        lo = bisect_left(self._latin, token)
+        hi = bisect_left(self._latin, token + "\x7f", lo)
+        if hi - lo <= 1:
+            return self.postings[self._latin[lo]] if hi > lo else (_EMPTY_ROWS, None)
+        matches = [self.postings[t] for t in self._latin[lo:hi]]
+        rows = np.concatenate([m[0] for m in matches])
+        weights = np.concatenate([m[1] for m in matches])
+        order = np.argsort(rows, kind="stable")
+        rows, weights = rows[order], weights[order]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        return rows[starts], np.maximum.reduceat(weights, starts)
+
+    def search(self, query: str) -> list:
+        """按相关度降序返回命中的行号（同分按原顺序）"""
+        lists = sorted((self._posting(t) for t in _query_tokens(query)), key=lambda p: len(p[0]))
+        if not lists or not len(lists[0][0]):
+            return []
+        # 从最短的倒排表出发，在其余（有序的）倒排表里二分查找
+        rows, scores = lists[0]
+        for other_rows, other_weights in lists[1:]:
+            pos = np.searchsorted(other_rows, rows)
+            pos[pos == len(other_rows)] = 0
+            found = other_rows[pos] == rows
+            rows, scores = rows[found], scores[found] + other_weights[pos[found]]
+            if not len(rows):
+                return []
+        # 行号本来有序，稳定排序后同分保持原顺序
+        return rows[np.argsort(-scores, kind="stable")].tolist()
+
+
+_EMPTY_ROWS = np.empty(0, dtype=np.int32)
+
+
+def _is_prefix_token(token: str) -> bool:
+    return token.isascii() and not token.isdigit()
+
+
+def _search_index(spreadsheet_id: str, title: str, dataset: dict) -> _SearchIndex:
+    """每份数据只建一次索引；内容哈希变了才重建。索引只读，所有会话共享。
+    和数据集放在同一个 LRU 里：按计划分别缓存，内存计入 FITNESS_DATASET_CACHE_MB"""
+    def build():
+        with stage_timer("search/index"):
+            return _SearchIndex(dataset["frame"], SEARCH_FIELDS[title])
+
+    return _dataset_cache().get_or_render((spreadsheet_id, title, dataset["hash"], "search"), build)
+
+
+def search_dataset(spreadsheet_id: str, dataset: dict, title: str, query: str) -> tuple:
+    """按搜索词取子集：返回 (frame, records)，按相关度排序；搜索词为空（或只有标点、emoji）时原样返回"""
+    if not _query_tokens(query):
+        return dataset["frame"], dataset["records"]
+    index = _search_index(spreadsheet_id, title, dataset)
+    with stage_timer("search/query"):
+        hits = index.search(query)
+    records = dataset["records"]
+    return dataset["frame"].iloc[hits], [records[i] for i in hits]
+
+
+def search_box(key: str, placeholder: str) -> str:
+    return st.text_input("搜索", key=key, placeholder=placeholder, label_visibility="collapsed")
+
+
+# ============================================================
+# 渲染结果缓存：所有会话共享，按 (视图, 设备, 数据哈希, 筛选条件) 作键
+# ============================================================
+class _LruCache:
+    """按内存占用封顶的 LRU，值只读、跨会话共享；sizeof 估算每个值占用的字节数"""
+
+    def __init__(self, max_bytes: int, sizeof):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """命中返回值，未命中返回 None（值本身不会是 None）"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key not in self._items and size <= self.max_bytes:
+                self._items[key] = (value, size)
+                self.nbytes += size
+                while self.nbytes > self.max_bytes:
+                    _, (_, evicted) = self._items.popitem(last=False)
+                    self.nbytes -= evicted
+        return value
+
+    def get_or_render(self, key, render):
+        value = self.get(key)
+        if value is None:
+            # 渲染放在锁外，避免一个慢渲染挡住其它会话
+            value = self.put(key, render())
+        return value
+
+    def entries(self) -> list:
+        """[(键, 值)]，从最久未用到最近使用"""
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._items.items()]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _html_nbytes(value) -> int:
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+
+
+@st.cache_resource
+def _html_cache() -> _LruCache:
+    """值是 HTML 字符串或 HTML 片段元组（不可变）"""
+    return _LruCache(HTML_CACHE_MAX_BYTES, _html_nbytes)
+
+
+def _frozen(value):
+    return value if isinstance(value, str) else tuple(value)
+
+
+def cached_html(key, render):
+    """key 为 None 时不走缓存；否则命中直接返回，未命中调用 render() 并写入 LRU"""
+    if key is None:
+        return render()
+    return _html_cache().get_or_render(key, lambda: _frozen(render()))
+
+
+def _filter_key(selected) -> frozenset:
+    return frozenset(selected)
 
 
 # ============================================================
@@ -73,160 +1682,205 @@ CATEGORY_COLORS = {
 
 
 def _get_type_badge(action_type: str) -> str:
-    for emoji, (label, color, bg) in TYPE_BADGES.items():
-        if emoji in str(action_type):
-            return f'<span style="display:inline-block;padding:2px 8px;border-radius:12px;font-size:12px;font-weight:600;color:{color};background:{bg};">{emoji} {label}</span>'
+    emoji = _classifier("type")(action_type)
+    if emoji:
+        return _classifier("type_badge")[emoji]
     if action_type.strip():
-        return f'<span style="display:inline-block;padding:2px 8px;border-radius:12px;font-size:12px;background:#f5f5f5;">{action_type}</span>'
+        return f'<span {_css(STYLES["pill-plain"])}>{action_type}</span>'
     return ""
 
 
 # ============================================================
 # 手机端：卡片式渲染
 # ============================================================
-def render_mobile_exercise_card(row, header, index):
-    name = row[header.index("动作名称")] if "动作名称" in header else ""
-    action_type = row[header.index("动作类型")] if "动作类型" in header else ""
-    sets = row[header.index("组数x次数")] if "组数x次数" in header else ""
-    tempo = row[header.index("节奏/要点")] if "节奏/要点" in header else ""
-    rpe = row[header.index("目标RPE")] if "目标RPE" in header else ""
-    progression = row[header.index("渐进规则")] if "渐进规则" in header else ""
-    note = row[header.index("注意事项")] if "注意事项" in header else ""
-    phase = row[header.index("阶段")] if "阶段" in header else ""
+def render_mobile_exercise_card(row, cols, index):
+    name = _field(row, cols, "动作名称")
+    action_type = _field(row, cols, "动作类型")
+    sets = _field(row, cols, "组数x次数")
+    tempo = _field(row, cols, "节奏/要点")
+    rpe = _field(row, cols, "目标RPE")
+    intensity = _field(row, cols, "强度")
+    progression = _field(row, cols, "渐进规则")
+    note = _field(row, cols, "注意事项")
 
     # 根据动作类型选择左边框颜色
-    border_color = "#ddd"
-    for emoji, (_, color, _) in TYPE_BADGES.items():
-        if emoji in str(action_type):
-            border_color = color
-            break
+    emoji = _classifier("type")(action_type)
+    border_color = TYPE_BADGES[emoji][1] if emoji else "#ddd"
 
     badge = _get_type_badge(action_type)
 
     # RPE 颜色
     rpe_html = ""
     if rpe.strip():
-        rpe_color = "#c62828" if any(x in rpe for x in ("7", "8", "9")) else "#2e7d32"
-        rpe_html = f'<span style="display:inline-block;padding:2px 8px;border-radius:12px;font-size:13px;font-weight:bold;color:white;background:{rpe_color};">RPE {rpe}</span>'
+        rpe_style = STYLES["rpe-high"] if intensity == "high" else STYLES["rpe-low"]
+        rpe_html = f'<span {_css(rpe_style)}>RPE {rpe}</span>'
 
     # 警告标记
     has_warning = "⚠️" in note
-    warning_border = "border-left:4px solid #ff9800;" if has_warning else f"border-left:4px solid {border_color};"
+    warning_border = COLOR_STYLES["border"].format("#ff9800" if has_warning else border_color)
 
     card_html = f'''
-    <div style="{warning_border}background:white;border-radius:8px;padding:14px 16px;margin-bottom:10px;box-shadow:0 1px 3px rgba(0,0,0,0.08);">
-        <div style="display:flex;justify-content:space-between;align-items:center;margin-bottom:6px;">
-            <span style="font-size:17px;font-weight:700;color:#1a1a2e;">{index}. {name}</span>
+    <div {_css(warning_border, STYLES["card"])}>
+        <div {_css(STYLES["card-head"])}>
+            <span {_css(STYLES["name-l"])}>{index}. {name}</span>
             {badge}
         </div>'''
 
     if sets.strip():
-        card_html += f'<div style="font-size:15px;color:#333;margin-bottom:4px;">📊 <b>{sets}</b></div>'
+        card_html += f'<div {_css(STYLES["sets"])}>📊 <b>{sets}</b></div>'
 
     if tempo.strip():
-        card_html += f'<div style="font-size:13px;color:#555;margin-bottom:4px;">⏱ {tempo}</div>'
+        card_html += f'<div {_css(STYLES["tempo"])}>⏱ {tempo}</div>'
 
     if rpe_html:
-        card_html += f'<div style="margin-bottom:4px;">{rpe_html}</div>'
+        card_html += f'<div {_css(STYLES["mb4"])}>{rpe_html}</div>'
 
     if progression.strip():
-        card_html += f'<div style="font-size:12px;color:#666;margin-bottom:4px;">📈 {progression}</div>'
+        card_html += f'<div {_css(STYLES["progression"])}>📈 {progression}</div>'
 
     if note.strip():
-        note_bg = "#fff3e0" if has_warning else "#f8f9fa"
-        note_color = "#e65100" if has_warning else "#444"
-        card_html += f'<div style="font-size:13px;color:{note_color};background:{note_bg};padding:8px 10px;border-radius:6px;margin-top:6px;line-height:1.6;">{note}</div>'
+        card_html += f'<div {_css(STYLES["note-warn" if has_warning else "note"])}>{note}</div>'
 
     card_html += '</div>'
     return card_html
 
 
-def render_mobile_day(day_name, day_df, header):
+# 本次运行合并发送省下的元素数和字节数（脚本每次 rerun 都会重新初始化）
+PAYLOAD_SAVINGS = {"elements": 0, "bytes": 0}
+
+
+def _emit_fragments(fragments):
+    for fragment in fragments:
+        emit_html(fragment)
+
+
+def _compact_html(fragment: str) -> str:
+    # 去掉缩进和空行：缩进 4 格会被 markdown 当成代码块，空行会提前结束 HTML 块
+    return "\n".join(line.strip() for line in fragment.splitlines() if line.strip())
+
+
+def _mobile_document(fragments) -> tuple:
+    """把一个视图的所有片段拼成一个 HTML 文档，返回 (文档, 省下的元素数, 省下的字节数)"""
+    fragments = list(fragments)
+    doc = "\n".join(_compact_html(f) for f in fragments)
+    per_card_bytes = sum(len(f.encode("utf-8")) for f in fragments)
+    return doc, max(len(fragments) - 1, 0), per_card_bytes - len(doc.encode("utf-8"))
+
+
+def _emit_mobile_view(cache_key, build):
+    if not MOBILE_SINGLE_PAYLOAD:
+        _emit_fragments(cached_html(cache_key, build))
+        return
+    doc_key = None if cache_key is None else cache_key + ("doc",)
+    doc, elements_saved, bytes_saved = cached_html(doc_key, lambda: _mobile_document(build()))
+    if doc:
+        emit_html(doc)
+    PAYLOAD_SAVINGS["elements"] += elements_saved
+    PAYLOAD_SAVINGS["bytes"] += bytes_saved
+
+
+def render_mobile_day(day_name, rows, cols, cache_key=None):
+    _emit_mobile_view(cache_key, lambda: _mobile_day_fragments(day_name, rows, cols))
+
+
+@timed("render/mobile_day")
+def _mobile_day_fragments(day_name, rows, cols):
     color, bg, icon = DAY_COLORS.get(day_name, ("#333", "#f5f5f5", "📋"))
+    fragments = []
 
     html = f'''
-    <div style="background:{bg};border-radius:12px;padding:16px;margin-bottom:20px;">
-        <div style="font-size:20px;font-weight:800;color:{color};margin-bottom:12px;text-align:center;">
+    <div {_css(COLOR_STYLES["day"].format(color, bg))}>
+        <div {_css(COLOR_STYLES["day-title"].format(color, bg))}>
             {icon} {day_name}
         </div>
     </div>'''
-    st.markdown(html, unsafe_allow_html=True)
+    fragments.append(html)
 
     # 按阶段分组显示
-    phase_col = header.index("阶段") if "阶段" in header else -1
+    phase_col = cols.get("阶段", -1)
     current_phase = ""
     exercise_num = 1
 
-    for _, row_series in day_df.iterrows():
-        row = row_series.tolist()
+    for row in rows:
         if phase_col >= 0:
             phase = row[phase_col]
             if phase and phase != current_phase:
                 current_phase = phase
-                phase_color = "#6a1b9a" if "拉伸" in phase else "#00695c" if "热身" in phase or "激活" in phase else "#1565c0"
-                st.markdown(
-                    f'<div style="font-size:14px;font-weight:700;color:{phase_color};padding:8px 0 4px 0;border-bottom:2px solid {phase_color};margin:12px 0 8px 0;">{phase}</div>',
-                    unsafe_allow_html=True,
+                phase_color = _classifier("phase_color")(phase)
+                fragments.append(
+                    f'<div {_css(COLOR_STYLES["phase"].format(phase_color))}>{phase}</div>'
                 )
 
-        name = row[header.index("动作名称")] if "动作名称" in header else ""
+        name = _field(row, cols, "动作名称")
         if name.strip() and "严禁" not in name:
-            card = render_mobile_exercise_card(row, header, exercise_num)
-            st.markdown(card, unsafe_allow_html=True)
+            fragments.append(render_mobile_exercise_card(row, cols, exercise_num))
             exercise_num += 1
         elif "严禁" in name:
-            note = row[header.index("注意事项")] if "注意事项" in header else ""
-            st.markdown(
-                f'<div style="background:#fff0f0;border-left:4px solid #c62828;padding:10px 14px;border-radius:6px;margin-bottom:10px;font-size:14px;color:#c62828;font-weight:600;">🚫 {name}：{note}</div>',
-                unsafe_allow_html=True,
+            note = _field(row, cols, "注意事项")
+            fragments.append(
+                f'<div {_css(STYLES["forbidden"])}>🚫 {name}：{note}</div>'
             )
 
+    return fragments
 
-def render_mobile_body(df):
-    df.iloc[:, 0] = df.iloc[:, 0].replace("", pd.NA).ffill().fillna("")
+
+def render_mobile_body(rows, cache_key=None):
+    """rows 为规整后的记录（首列已向下填充）"""
+    _emit_mobile_view(cache_key, lambda: _mobile_body_fragments(rows))
+
+
+@timed("render/mobile_body")
+def _mobile_body_fragments(rows):
+    fragments = []
     current_cat = ""
-    for _, row in df.iterrows():
-        cat = str(row.iloc[0])
-        item = str(row.iloc[1])
-        detail = str(row.iloc[2]) if len(row) > 2 else ""
+    for row in rows:
+        cat = str(row[0])
+        item = str(row[1])
+        detail = str(row[2]) if len(row) > 2 else ""
 
         if cat != current_cat:
             current_cat = cat
             color, bg = CATEGORY_COLORS.get(cat, ("#333", "#f5f5f5"))
-            st.markdown(
-                f'<div style="background:{bg};padding:10px 14px;border-radius:8px;margin:16px 0 8px 0;font-size:16px;font-weight:700;color:{color};">{cat}</div>',
-                unsafe_allow_html=True,
+            fragments.append(
+                f'<div {_css(COLOR_STYLES["category"].format(color, bg))}>{cat}</div>'
             )
 
         if item.strip():
-            st.markdown(
-                f'''<div style="background:white;border-left:3px solid #ddd;padding:10px 14px;margin-bottom:8px;border-radius:6px;box-shadow:0 1px 2px rgba(0,0,0,0.05);">
-                    <div style="font-size:15px;font-weight:600;color:#1a1a2e;margin-bottom:4px;">{item}</div>
-                    <div style="font-size:13px;color:#555;line-height:1.6;">{detail}</div>
-                </div>''',
-                unsafe_allow_html=True,
+            fragments.append(
+                f'''<div {_css(STYLES["item"])}>
+                    <div {_css(STYLES["item-title"])}>{item}</div>
+                    <div {_css(STYLES["item-detail"])}>{detail}</div>
+                </div>'''
             )
 
+    return fragments
+
 
-def render_mobile_lib(df):
-    for _, row in df.iterrows():
-        name = str(row.get("动作名称", ""))
-        atype = str(row.get("动作类型", ""))
-        muscle = str(row.get("目标肌群", ""))
-        note = str(row.get("道长专属注意事项", ""))
+def render_mobile_lib(rows, cols, cache_key=None):
+    _emit_mobile_view(cache_key, lambda: _mobile_lib_fragments(rows, cols))
+
+
+@timed("render/mobile_lib")
+def _mobile_lib_fragments(rows, cols):
+    fragments = []
+    for row in rows:
+        name = str(_field(row, cols, "动作名称"))
+        atype = str(_field(row, cols, "动作类型"))
+        muscle = str(_field(row, cols, "目标肌群"))
+        note = str(_field(row, cols, "道长专属注意事项"))
         badge = _get_type_badge(atype)
 
-        st.markdown(
-            f'''<div style="background:white;border-radius:8px;padding:12px 14px;margin-bottom:8px;box-shadow:0 1px 3px rgba(0,0,0,0.08);">
-                <div style="display:flex;justify-content:space-between;align-items:center;margin-bottom:4px;">
-                    <span style="font-size:15px;font-weight:700;color:#1a1a2e;">{name}</span>
+        fragments.append(
+            f'''<div {_css(STYLES["lib-card"])}>
+                <div {_css(STYLES["lib-head"])}>
+                    <span {_css(STYLES["name"])}>{name}</span>
                     {badge}
                 </div>
-                <div style="font-size:13px;color:#666;margin-bottom:4px;">🎯 {muscle}</div>
-                <div style="font-size:12px;color:#555;line-height:1.5;">{note}</div>
-            </div>''',
-            unsafe_allow_html=True,
+                <div {_css(STYLES["muscle"])}>🎯 {muscle}</div>
+                <div {_css(STYLES["lib-note"])}>{note}</div>
+            </div>'''
         )
+    return fragments
 
 
 # ============================================================
@@ -252,17 +1906,23 @@ STATUS_STYLE = {
 
 
 def _badge(text, color, bg):
-    return f'<span style="display:inline-block;padding:2px 8px;border-radius:12px;font-size:12px;font-weight:600;color:{color};background:{bg};">{text}</span>'
+    return f'<span {_css(STYLES["pill"], COLOR_STYLES["badge"].format(color, bg))}>{text}</span>'
+
+
+def render_mobile_notes(rows, cols, cache_key=None):
+    _emit_mobile_view(cache_key, lambda: _mobile_notes_fragments(rows, cols))
 
 
-def render_mobile_notes(df):
-    for _, row in df.iterrows():
-        date = str(row.get("日期", ""))
-        name = str(row.get("动作名称", ""))
-        problem = str(row.get("问题发现", ""))
-        fix = str(row.get("修正建议", ""))
-        priority = str(row.get("优先级", "")).strip()
-        status = str(row.get("状态", "")).strip()
+@timed("render/mobile_notes")
+def _mobile_notes_fragments(rows, cols):
+    fragments = []
+    for row in rows:
+        date = str(_field(row, cols, "日期"))
+        name = str(_field(row, cols, "动作名称"))
+        problem = str(_field(row, cols, "问题发现"))
+        fix = str(_field(row, cols, "修正建议"))
+        priority = str(_field(row, cols, "优先级")).strip()
+        status = str(_field(row, cols, "状态")).strip()
 
         p_color, p_bg = PRIORITY_STYLE.get(priority, ("#333", "#f5f5f5"))
         s_color, s_bg = STATUS_STYLE.get(status, ("#333", "#f5f5f5"))
@@ -271,137 +1931,298 @@ def render_mobile_notes(df):
         border_color = "#00695c" if is_general else p_color
 
         card = f'''
-        <div style="border-left:4px solid {border_color};background:white;border-radius:8px;padding:14px 16px;margin-bottom:10px;box-shadow:0 1px 3px rgba(0,0,0,0.08);">
-            <div style="display:flex;justify-content:space-between;align-items:center;margin-bottom:6px;">
-                <span style="font-size:15px;font-weight:700;color:#1a1a2e;">{name}</span>
-                {_badge(priority, p_color, p_bg)}
+        <div {_css(COLOR_STYLES["border"].format(border_color), STYLES["card"])}>
+            <div {_css(STYLES["card-head"])}>
+                <span {_css(STYLES["name"])}>{name}</span>
+                {_classifier("priority_badge").get(priority) or _badge(priority, p_color, p_bg)}
             </div>
-            <div style="font-size:12px;color:#888;margin-bottom:6px;">{date} {_badge(status, s_color, s_bg)}</div>
-            <div style="font-size:13px;color:#c62828;background:#fff0f0;padding:8px 10px;border-radius:6px;margin-bottom:6px;line-height:1.6;">⚠️ {problem}</div>
-            <div style="font-size:13px;color:#2e7d32;background:#e8f5e9;padding:8px 10px;border-radius:6px;line-height:1.6;">✅ {fix}</div>
+            <div {_css(STYLES["date"])}>{date} {_classifier("status_badge").get(status) or _badge(status, s_color, s_bg)}</div>
+            <div {_css(STYLES["problem"])}>⚠️ {problem}</div>
+            <div {_css(STYLES["fix"])}>✅ {fix}</div>
         </div>'''
-        st.markdown(card, unsafe_allow_html=True)
+        fragments.append(card)
+    return fragments
 
 
 # ============================================================
 # 电脑端：表格渲染（保留原有逻辑）
 # ============================================================
-def render_table_with_rowspan(df: pd.DataFrame, merge_col: int = 0) -> str:
+def _table_head(df: pd.DataFrame) -> str:
+    return '<table class="fit-table"><thead><tr>' + ''.join(f'<th>{col}</th>' for col in df.columns) + '</tr></thead>'
+
+
+@timed("render/render_table_with_rowspan")
+def render_table_with_rowspan(df: pd.DataFrame, merge_col: int = 0, typed=None) -> str:
     if df.empty:
         return "<p>无数据</p>"
+    return _table_head(df) + '<tbody>' + _rowspan_rows(df, merge_col, typed) + '</tbody></table>'
+
 
-    html = ['<table class="fit-table">']
-    html.append('<thead><tr>')
-    for col in df.columns:
-        html.append(f'<th>{col}</th>')
-    html.append('</tr></thead>')
-
-    html.append('<tbody>')
-    first_col = df.iloc[:, merge_col].tolist()
-    i = 0
-    while i < len(df):
-        curr_val = first_col[i]
-        span = 1
-        while i + span < len(df) and first_col[i + span] == curr_val:
-            span += 1
-
-        html.append('<tr>')
-        for j in range(len(df.columns)):
-            if j == merge_col:
-                css = _get_category_css(curr_val)
-                html.append(f'<td rowspan="{span}" class="merged-cell" {css}>{curr_val}</td>')
+@timed("render/render_weekly_table")
+def render_weekly_table(dataset: dict, selected) -> str:
+    """逐个训练日拼接表格行：内容没变的训练日直接复用缓存的 HTML"""
+    days = [day for day in dataset["groups"] if day in selected]
+    if not days:
+        return "<p>无数据</p>"
+    return _table_head(dataset["frame"]) + '<tbody>' + ''.join(_day_rows(dataset, days)) + '</tbody></table>'
+
+
+def _day_rows(dataset: dict, days) -> list:
+    """各训练日的 <tr> HTML。缓存没命中的训练日合并成一张表整列渲染一次，再按各天的行数切开写回缓存：
+    逐天渲染时每天都要付一遍 pandas 的固定开销，训练日多、每天行数少时比整表渲染慢一个数量级"""
+    groups, cache = dataset["groups"], _html_cache()
+    keys = {day: ("周训练计划/day", False, groups[day]["hash"], None) for day in days}
+    html = {day: cache.get(keys[day]) for day in days}
+    missing = [day for day in days if html[day] is None]
+    if missing:
+        index = [i for day in missing for i in groups[day]["index"]]
+        rows = _rowspan_row_list(dataset["frame"].iloc[index], 0, dataset["typed"])
+        start = 0
+        for day in missing:
+            stop = start + len(groups[day]["index"])
+            html[day] = cache.put(keys[day], "".join(rows[start:stop]))
+            start = stop
+    return [html[day] for day in days]
+
+
+def _styled_columns(df: pd.DataFrame, typed=None) -> list:
+    """逐列生成 <td>：每列只对不同的取值各调用一次 _style_cell；目标RPE 按强度整列着色
+    （有 typed 时直接读强度列，否则现场解析这几行，例如动作库、训练笔记的简单表格）"""
+    cols = []
+    for j, col_name in enumerate(df.columns):
+        col = df.iloc[:, j].astype(str)
+        if col_name == "目标RPE":
+            if typed is not None and "强度" in typed.columns:
+                intensity = typed["强度"].loc[df.index]
             else:
-                cell = str(df.iloc[i, j])
-                cell = _style_cell(cell, df.columns[j])
-                html.append(f'<td>{cell}</td>')
-        html.append('</tr>')
-
-        for k in range(1, span):
-            html.append('<tr>')
-            for j in range(len(df.columns)):
-                if j == merge_col:
-                    continue
-                cell = str(df.iloc[i + k, j])
-                cell = _style_cell(cell, df.columns[j])
-                html.append(f'<td>{cell}</td>')
-            html.append('</tr>')
+                intensity = _parse_distinct(col, parse_rpe)["强度"]
+            styled = _rpe_cells(col, intensity)
+        else:
+            styled = col.map({v: _style_cell(v) for v in col.unique()})
+        cols.append(("<td>" + styled + "</td>").tolist())
+    return cols
+
+
+def _rpe_cells(col: pd.Series, intensity: pd.Series) -> pd.Series:
+    """不属于高 / 低强度的单元格也去掉首尾空白（与着色的单元格一致）"""
+    text = col.str.strip()
+    styled = text.copy()
+    for level in ("high", "low"):
+        mask = (intensity == level).to_numpy()
+        styled[mask] = f'<span {_css(STYLES["rpe-cell-" + level])}>' + text[mask] + "</span>"
+    return styled
+
 
-        i += span
+def _join_columns(cols: list, n_rows: int) -> list:
+    if not cols:
+        return [""] * n_rows
+    return ["".join(cells) for cells in zip(*cols)]
 
-    html.append('</tbody></table>')
-    return ''.join(html)
 
+def _rowspan_rows(df: pd.DataFrame, merge_col: int, typed=None) -> str:
+    return "".join(_rowspan_row_list(df, merge_col, typed))
 
+
+def _rowspan_row_list(df: pd.DataFrame, merge_col: int, typed=None) -> list:
+    """每行一个 <tr>；merge_col 列连续相同的取值合并成一个 rowspan 单元格"""
+    if df.empty:
+        return []
+    merge = df.iloc[:, merge_col]
+    # 连续相同值为一段：段首 = 与上一行不同；段长 = 同段号的行数
+    starts = merge.ne(merge.shift())
+    run_id = starts.cumsum()
+    spans = run_id.map(run_id.value_counts())
+
+    merged = [
+        f'<td rowspan="{span}" {_get_category_css(val)}>{val}</td>' if start else ""
+        for val, start, span in zip(merge.tolist(), starts.tolist(), spans.tolist())
+    ]
+    cols = _styled_columns(df, typed)
+    before = _join_columns(cols[:merge_col], len(df))
+    after = _join_columns(cols[merge_col + 1:], len(df))
+    return [f"<tr>{b}{m}{a}</tr>" for b, m, a in zip(before, merged, after)]
+
+
+@timed("render/render_simple_table")
 def render_simple_table(df: pd.DataFrame) -> str:
     if df.empty:
         return "<p>无数据</p>"
+    rows = _join_columns(_styled_columns(df), len(df))
+    return _table_head(df) + "<tbody>" + "".join(f"<tr>{r}</tr>" for r in rows) + "</tbody></table>"
+
+
+# ============================================================
+# 浏览器端筛选组件：筛选不再触发 rerun；整张表随组件参数在每次运行时重发，
+# 动作库 / 训练笔记超过 CLIENT_FILTER_MAX_ROWS 行时改用服务端分页
+# ============================================================
+def use_client_filter(n_rows: int) -> bool:
+    """按整张表（而不是搜索结果）的行数判断，搜索时筛选控件不会在组件和 st.multiselect 之间来回切换"""
+    return CLIENT_FILTERS and n_rows <= CLIENT_FILTER_MAX_ROWS
 
-    html = ['<table class="fit-table">']
-    html.append('<thead><tr>')
-    for col in df.columns:
-        html.append(f'<th>{col}</th>')
-    html.append('</tr></thead><tbody>')
 
-    for i in range(len(df)):
-        html.append('<tr>')
-        for j in range(len(df.columns)):
-            cell = str(df.iloc[i, j])
-            cell = _style_cell(cell, df.columns[j])
-            html.append(f'<td>{cell}</td>')
-        html.append('</tr>')
+@st.cache_resource
+def _client_filter():
+    """每个进程只声明一次：declare_component 要遍历 sys.modules 推断模块名，放在脚本顶层会让每次 rerun 多出几百毫秒"""
+    return components.declare_component(
+        "client_filter",
+        path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "client_filter"),
+    )
 
-    html.append('</tbody></table>')
-    return ''.join(html)
+
+def _client_filter_payload(open_html, close_html, items, filters, caption) -> str:
+    """items: [(带 data-i 的 HTML, {筛选键: 值}, 行数)]；filters: [(筛选键, 标题, 选项)]
+
+    caption 中的 {rows} / {selected} 由浏览器按当前筛选结果填入；浏览器每次只把当前页的 PAGE_SIZE 项放进 DOM。
+    """
+    return json.dumps(
+        {
+            "open": open_html,
+            "close": close_html,
+            "items": [{"html": html, "keys": keys, "n": n} for html, keys, n in items],
+            "filters": [{"key": k, "label": label, "options": options} for k, label, options in filters],
+            "caption": caption,
+            "page_size": PAGE_SIZE,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+@timed("render/weekly_filter_payload")
+def weekly_filter_payload(dataset: dict) -> str:
+    """每个训练日一个 <tbody>，按训练日整段显示/隐藏，rowspan 不受影响"""
+    frame, groups = dataset["frame"], dataset["groups"]
+    items = [
+        (f'<tbody data-i="{i}">{rows}</tbody>', {"day": day}, len(groups[day]["index"]))
+        for i, (day, rows) in enumerate(zip(groups, _day_rows(dataset, list(groups))))
+    ]
+    filters = [("day", "筛选训练日", list(groups))]
+    return _client_filter_payload(_table_head(frame), "</table>", items, filters, "共 {rows} 行 · {selected} 个训练日")
+
+
+@timed("render/table_filter_payload")
+def table_filter_payload(df: pd.DataFrame, filter_cols, caption: str, options_df=None) -> str:
+    """filter_cols: [(列名, 标题)]，表中没有的列会被跳过。
+
+    options_df：筛选选项取自这张表（传整张表），搜索结果变化时选项不变，浏览器里已选的筛选项就不会被重置。
+    """
+    rows = _join_columns(_styled_columns(df), len(df))
+    options_df = df if options_df is None else options_df
+    filters = [
+        (col, label, options_df[col].unique().tolist()) for col, label in filter_cols if col in df.columns
+    ]
+    values = [df[col].tolist() for col, _, _ in filters]
+    items = [
+        (f'<tr data-i="{i}">{row}</tr>', {f[0]: v[i] for f, v in zip(filters, values)}, 1)
+        for i, row in enumerate(rows)
+    ]
+    return _client_filter_payload(_table_head(df) + "<tbody>", "</tbody></table>", items, filters, caption)
+
+
+def render_client_filter(payload: str, version: str, key: str):
+    t0 = time.perf_counter()
+    _client_filter()(version=version, payload=payload, css=page_css(), key=key, default=None)
+    if METRICS:
+        record_stage("emit/component", time.perf_counter() - t0, len(payload.encode("utf-8")), 1)
+
+
+# ============================================================
+# 样式分类表：由颜色映射一次编译成单个正则，按取值缓存结果
+# ============================================================
+
+# 合并单元格的配色规则（按优先级排列）：(关键词, 配色表)，颜色取配色表中含第一个关键词的那一项
+CATEGORY_RULES = (
+    (("伤病", "🔴"), CATEGORY_COLORS),
+    (("禁忌", "🚫", "⚠️"), CATEGORY_COLORS),
+    (("恢复", "🟢"), CATEGORY_COLORS),
+    (("环境", "🟡"), CATEGORY_COLORS),
+    (("营养", "🔵"), CATEGORY_COLORS),
+    (("原则", "📋"), CATEGORY_COLORS),
+    (("练后拉伸",), DAY_COLORS),
+    (("热身",), DAY_COLORS),
+    (("第7天", "完全休息"), DAY_COLORS),
+    (("第6天",), DAY_COLORS),
+    (("第1天", "第5天"), DAY_COLORS),
+    (("第2天",), DAY_COLORS),
+    (("第3天",), DAY_COLORS),
+    (("第4天",), DAY_COLORS),
+)
+
+PHASE_RULES = (
+    (("拉伸",), "#6a1b9a"),
+    (("热身", "激活"), "#00695c"),
+)
+
+_MISSING = object()
+
+
+class _Classifier:
+    """有序关键词规则 → 单个正则：一次扫描取命中的最高优先级规则，结果按取值缓存"""
+
+    def __init__(self, rules, default):
+        rank = {}
+        for i, (keywords, _) in enumerate(rules):
+            for kw in keywords:
+                rank.setdefault(kw, i)
+        # 同一位置只会报告最长的关键词，所以把它的前缀关键词的优先级也算进来
+        self._rank = {kw: min(r for k, r in rank.items() if kw.startswith(k)) for kw in rank}
+        alternatives = "|".join(re.escape(kw) for kw in sorted(rank, key=len, reverse=True))
+        self._regex = re.compile(f"(?=({alternatives}))")
+        self._results = [result for _, result in rules]
+        self._default = default
+        self._memo = {}
+
+    def __call__(self, value):
+        value = str(value)
+        result = self._memo.get(value, _MISSING)
+        if result is _MISSING:
+            ranks = [self._rank[m.group(1)] for m in self._regex.finditer(value)]
+            result = self._results[min(ranks)] if ranks else self._default
+            if len(self._memo) < CLASSIFIER_MEMO_SIZE:
+                self._memo[value] = result
+        return result
+
+
+def _colors_for(table: dict, keyword: str) -> tuple:
+    return next(colors for name, colors in table.items() if keyword in name)
+
+
+@st.cache_resource
+def _compiled_classifiers() -> dict:
+    category_rules = []
+    for keywords, table in CATEGORY_RULES:
+        color, bg = _colors_for(table, keywords[0])[:2]
+        category_rules.append((keywords, _css(COLOR_STYLES["merged-cell"].format(color, bg), cls="merged-cell")))
+    return {
+        "category_css": _Classifier(category_rules, _css(STYLES["merged-cell"], cls="merged-cell")),
+        "type": _Classifier([((emoji,), emoji) for emoji in TYPE_BADGES], None),
+        "phase_color": _Classifier(PHASE_RULES, "#1565c0"),
+        "type_badge": {
+            emoji: f'<span {_css(STYLES["pill"], COLOR_STYLES["badge"].format(color, bg))}>{emoji} {label}</span>'
+            for emoji, (label, color, bg) in TYPE_BADGES.items()
+        },
+        "priority_badge": {k: _badge(k, color, bg) for k, (color, bg) in PRIORITY_STYLE.items()},
+        "status_badge": {k: _badge(k, color, bg) for k, (color, bg) in STATUS_STYLE.items()},
+    }
+
+
+_CLASSIFIERS = {}  # 本次运行内的引用，避免每个单元格都查一次 cache_resource
+
+
+def _classifier(name: str):
+    if not _CLASSIFIERS:
+        _CLASSIFIERS.update(_compiled_classifiers())
+    return _CLASSIFIERS[name]
 
 
 def _get_category_css(val: str) -> str:
-    val = str(val)
-    if "伤病" in val or "🔴" in val:
-        return 'style="background-color:#fff0f0; color:#c0392b;"'
-    elif "禁忌" in val or "🚫" in val or "⚠️" in val:
-        return 'style="background-color:#fff3e0; color:#e65100;"'
-    elif "恢复" in val or "🟢" in val:
-        return 'style="background-color:#e8f5e9; color:#2e7d32;"'
-    elif "环境" in val or "🟡" in val:
-        return 'style="background-color:#fffde7; color:#f57f17;"'
-    elif "营养" in val or "🔵" in val:
-        return 'style="background-color:#e3f2fd; color:#1565c0;"'
-    elif "原则" in val or "📋" in val:
-        return 'style="background-color:#f3e5f5; color:#6a1b9a;"'
-    elif "练后拉伸" in val:
-        return 'style="background-color:#efebe9; color:#5d4037;"'
-    elif "热身" in val:
-        return 'style="background-color:#e0f7fa; color:#00695c;"'
-    elif "第7天" in val or "完全休息" in val:
-        return 'style="background-color:#fce4ec; color:#880e4f;"'
-    elif "第6天" in val:
-        return 'style="background-color:#f3e5f5; color:#4a148c;"'
-    elif "第1天" in val or "第5天" in val:
-        return 'style="background-color:#e8eaf6; color:#283593;"'
-    elif "第2天" in val:
-        return 'style="background-color:#e0f2f1; color:#004d40;"'
-    elif "第3天" in val:
-        return 'style="background-color:#f1f8e9; color:#33691e;"'
-    elif "第4天" in val:
-        return 'style="background-color:#fff8e1; color:#ff6f00;"'
-    return 'style="background-color:#fafafa;"'
-
-
-def _style_cell(cell: str, col_name: str) -> str:
-    if "💪" in cell:
-        return f'<span style="color:#1565c0; font-weight:600;">{cell}</span>'
-    elif "🎯" in cell:
-        return f'<span style="color:#e65100; font-weight:600;">{cell}</span>'
-    elif "🔧" in cell:
-        return f'<span style="color:#2e7d32; font-weight:600;">{cell}</span>'
-    elif "🧘" in cell:
-        return f'<span style="color:#6a1b9a; font-weight:600;">{cell}</span>'
-    if col_name == "目标RPE":
-        cell = cell.strip()
-        if cell in ("7-8", "8-9", "8"):
-            return f'<span style="color:#c62828; font-weight:bold;">{cell}</span>'
-        elif cell in ("4-5", "4", "5", "5-6"):
-            return f'<span style="color:#2e7d32;">{cell}</span>'
+    return _classifier("category_css")(val)
+
+
+def _style_cell(cell: str) -> str:
+    emoji = _classifier("type")(cell)
+    if emoji:
+        return f'<span {_css(COLOR_STYLES["type-cell"].format(TYPE_BADGES[emoji][1]))}>{cell}</span>'
     return cell
 
 
@@ -459,179 +2280,650 @@ GLOBAL_CSS = """
 
 
 # ============================================================
-# 主应用
+# 样式输出：内联 style="..."，或短 class 名 + 一份由配色表生成的样式表（CSS_CLASSES）
 # ============================================================
-st.markdown(GLOBAL_CSS, unsafe_allow_html=True)
+# 固定样式：名称 → 声明；class 模式下输出 class="f-名称"
+STYLES = {
+    "card": "background:white;border-radius:8px;padding:14px 16px;margin-bottom:10px;box-shadow:0 1px 3px rgba(0,0,0,0.08);",
+    "card-head": "display:flex;justify-content:space-between;align-items:center;margin-bottom:6px;",
+    "name-l": "font-size:17px;font-weight:700;color:#1a1a2e;",
+    "name": "font-size:15px;font-weight:700;color:#1a1a2e;",
+    "sets": "font-size:15px;color:#333;margin-bottom:4px;",
+    "tempo": "font-size:13px;color:#555;margin-bottom:4px;",
+    "mb4": "margin-bottom:4px;",
+    "progression": "font-size:12px;color:#666;margin-bottom:4px;",
+    "note": "font-size:13px;color:#444;background:#f8f9fa;padding:8px 10px;border-radius:6px;margin-top:6px;line-height:1.6;",
+    "note-warn": "font-size:13px;color:#e65100;background:#fff3e0;padding:8px 10px;border-radius:6px;margin-top:6px;line-height:1.6;",
+    "rpe-high": "display:inline-block;padding:2px 8px;border-radius:12px;font-size:13px;font-weight:bold;color:white;background:#c62828;",
+    "rpe-low": "display:inline-block;padding:2px 8px;border-radius:12px;font-size:13px;font-weight:bold;color:white;background:#2e7d32;",
+    "pill": "display:inline-block;padding:2px 8px;border-radius:12px;font-size:12px;font-weight:600;",
+    "pill-plain": "display:inline-block;padding:2px 8px;border-radius:12px;font-size:12px;background:#f5f5f5;",
+    "forbidden": "background:#fff0f0;border-left:4px solid #c62828;padding:10px 14px;border-radius:6px;margin-bottom:10px;font-size:14px;color:#c62828;font-weight:600;",
+    "item": "background:white;border-left:3px solid #ddd;padding:10px 14px;margin-bottom:8px;border-radius:6px;box-shadow:0 1px 2px rgba(0,0,0,0.05);",
+    "item-title": "font-size:15px;font-weight:600;color:#1a1a2e;margin-bottom:4px;",
+    "item-detail": "font-size:13px;color:#555;line-height:1.6;",
+    "lib-card": "background:white;border-radius:8px;padding:12px 14px;margin-bottom:8px;box-shadow:0 1px 3px rgba(0,0,0,0.08);",
+    "lib-head": "display:flex;justify-content:space-between;align-items:center;margin-bottom:4px;",
+    "muscle": "font-size:13px;color:#666;margin-bottom:4px;",
+    "lib-note": "font-size:12px;color:#555;line-height:1.5;",
+    "date": "font-size:12px;color:#888;margin-bottom:6px;",
+    "problem": "font-size:13px;color:#c62828;background:#fff0f0;padding:8px 10px;border-radius:6px;margin-bottom:6px;line-height:1.6;",
+    "fix": "font-size:13px;color:#2e7d32;background:#e8f5e9;padding:8px 10px;border-radius:6px;line-height:1.6;",
+    "topic-row": "margin-bottom:8px;",
+    "topic": "font-weight:700;font-size:14px;",
+    "topic-content": "font-size:13px;color:#444;",
+    "rpe-cell-high": "color:#c62828; font-weight:bold;",
+    "rpe-cell-low": "color:#2e7d32;",
+    "merged-cell": "background-color:#fafafa;",
+}
 
-# 检测屏幕宽度
-screen_width = streamlit_js_eval(js_expressions="window.innerWidth", key="screen_width")
-is_mobile = screen_width is not None and screen_width < 768
+# 带颜色的样式：名称 → 声明模板（{0} 字色，{1} 背景色）；配色表里每种颜色生成一个 class="f-名称-序号"
+COLOR_STYLES = {
+    "border": "border-left:4px solid {0};",
+    "badge": "color:{0};background:{1};",
+    "day": "background:{1};border-radius:12px;padding:16px;margin-bottom:20px;",
+    "day-title": "font-size:20px;font-weight:800;color:{0};margin-bottom:12px;text-align:center;",
+    "phase": "font-size:14px;font-weight:700;color:{0};padding:8px 0 4px 0;border-bottom:2px solid {0};margin:12px 0 8px 0;",
+    "category": "background:{1};padding:10px 14px;border-radius:8px;margin:16px 0 8px 0;font-size:16px;font-weight:700;color:{0};",
+    "merged-cell": "background-color:{1}; color:{0};",
+    "type-cell": "color:{0}; font-weight:600;",
+}
 
-if is_mobile:
-    st.markdown(
-        '<div style="text-align:center;padding:8px 0;"><span style="font-size:22px;font-weight:800;">💪 道长训练计划</span></div>',
-        unsafe_allow_html=True,
-    )
-else:
-    st.title("💪 道长训练计划")
-    st.caption("数据来源：Google Sheet · 实时同步")
-
-try:
-    gc = _get_client()
-
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📅 训练计划",
-        "📚 动作库",
-        "🏥 身体状况",
-        "📝 备注",
-        "🔬 训练笔记",
-    ])
-
-    # --- Tab 1: 周训练计划 ---
-    with tab1:
-        df_weekly = load_sheet(gc, "周训练计划")
-        if not df_weekly.empty:
-            header = df_weekly.columns.tolist()
-            day_data = get_day_data(df_weekly)
-            day_names = list(day_data.keys())
 
-            if is_mobile:
-                # 手机端：单日选择 + 卡片式展示
-                st.markdown(
-                    '<div style="font-size:14px;color:#666;text-align:center;margin-bottom:8px;">选择今天的训练日 👇</div>',
-                    unsafe_allow_html=True,
-                )
+def _style_palette() -> dict:
+    """COLOR_STYLES 各模板用到的 [(字色, 背景色)]，取自各配色表（含渲染时的默认色）"""
+    default = ("#333", "#f5f5f5")
+    types = [(c, bg) for _, c, bg in TYPE_BADGES.values()]
+    badges = types + list(PRIORITY_STYLE.values()) + list(STATUS_STYLE.values())
+    days = [(c, bg) for c, bg, _ in DAY_COLORS.values()] + [default]
+    # 卡片左边框：训练卡片按动作类型（⚠️ 橙色、无类型灰色），训练笔记按优先级（通用条目青色）
+    borders = [c for c, _ in types] + ["#ff9800", "#ddd"] + [c for c, _ in PRIORITY_STYLE.values()] + ["#00695c", "#333"]
+    return {
+        "border": [(c, "") for c in borders],
+        "badge": badges + [default],
+        "day": days,
+        "day-title": days,
+        "phase": [(c, "") for _, c in PHASE_RULES] + [("#1565c0", "")],
+        "category": list(CATEGORY_COLORS.values()) + [default],
+        "merged-cell": list(CATEGORY_COLORS.values()) + [(c, bg) for c, bg, _ in DAY_COLORS.values()],
+        "type-cell": [(c, "") for _, c, _ in TYPE_BADGES.values()],
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _style_classes() -> dict:
+    """声明 → class 名；只由常量决定，进程内算一次"""
+    names = {decl: f"f-{name}" for name, decl in STYLES.items()}
+    for name, palette in _style_palette().items():
+        for i, colors in enumerate(dict.fromkeys(palette)):
+            names.setdefault(COLOR_STYLES[name].format(*colors), f"f-{name}-{i}")
+    return names
+
+
+@functools.lru_cache(maxsize=None)
+def class_stylesheet() -> str:
+    """class 模式的样式表。合并单元格的底色加 !important，与内联 style 一样压过表格的斑马纹和悬停底色"""
+    rules = []
+    for decl, name in _style_classes().items():
+        if name.startswith("f-merged-cell"):
+            decl = ";".join(f"{d.strip()}!important" for d in decl.split(";") if d.strip())
+        rules.append(f".{name}{{{decl}}}")
+    return "<style>\n" + "\n".join(rules) + "\n</style>\n"
+
+
+def _css(*decls, cls: str = "") -> str:
+    """一组样式声明 → HTML 属性。内联模式原样写进 style；class 模式换成样式表里的 class，未登记的声明仍内联"""
+    if not CSS_CLASSES:
+        style = f'style="{"".join(decls)}"'
+        return f'class="{cls}" {style}' if cls else style
+    names = _style_classes()
+    classes, inline = [cls] if cls else [], []
+    for decl in decls:
+        name = names.get(decl)
+        if name:
+            classes.append(name)
+        else:
+            inline.append(decl)
+    attrs = [f'class="{" ".join(classes)}"'] if classes else []
+    if inline:
+        attrs.append(f'style="{"".join(inline)}"')
+    return " ".join(attrs)
 
-                # 排除"每日通用热身"和"每日练后拉伸"，单独显示
-                training_days = [d for d in day_names if "热身" not in d and "练后拉伸" not in d]
-                selected_day = st.selectbox(
-                    "训练日",
-                    options=training_days,
-                    index=0,
-                    key="mobile_day",
-                    label_visibility="collapsed",
-                )
 
-                # 先显示热身
-                warmup_key = [d for d in day_names if "热身" in d]
-                if warmup_key:
-                    with st.expander("🔥 每日通用热身（点击展开）", expanded=False):
-                        render_mobile_day(warmup_key[0], day_data[warmup_key[0]], header)
+def page_css() -> str:
+    """每页注入一次：全局样式 +（class 模式下）生成的样式表"""
+    return GLOBAL_CSS + class_stylesheet() if CSS_CLASSES else GLOBAL_CSS
+
+
+# ============================================================
+# 各视图（每个视图只读取、渲染自己那张工作表）
+# ============================================================
+HIGH_ONLY_LABEL = f"只看高强度（RPE ≥ {RPE_HIGH_MIN}）"
+
+
+def _number(row, cols: dict, name: str):
+    """解析列的取值，空或 NaN 时返回 None（用作输入框默认值）"""
+    value = _field(row, cols, name)
+    return None if value == "" or pd.isna(value) else value
+
+
+def _submit_log(spreadsheet_id, day, exercise, keys, tz):
+    """表单回调：在 rerun 之前写入队列，重跑时组序默认值已经是下一组"""
+    state = st.session_state
+    set_no, reps, weight, rpe = (state.get(k) for k in keys)
+    if log_set(spreadsheet_id, day, exercise, int(set_no), reps, weight, rpe, tz=tz):
+        state["log_notice"] = f"已记录：{exercise} 第 {set_no} 组"
+    else:
+        state["log_notice"] = f"{exercise} 第 {set_no} 组今天已经记录过"
+
+
+def workout_log_form(spreadsheet_id, day, rows, cols):
+    """手机训练日下方的记录表单：提交只写本地队列，后台线程定时批量同步到「训练记录」工作表"""
+    exercises = [row for row in rows if _field(row, cols, "动作名称").strip() and "严禁" not in _field(row, cols, "动作名称")]
+    if not exercises:
+        return
+    tz = log_timezone()
+    today = log_clock(tz)[0]
+    logged = logged_sets(spreadsheet_id, today, day)
+    with st.expander(f"✍️ 记录训练（今天已记录 {len(logged)} 组）"):
+        notice = st.session_state.pop("log_notice", None)
+        if notice:
+            st.toast(notice)
+        i = st.selectbox(
+            "动作", range(len(exercises)), key=f"log_exercise/{day}",
+            format_func=lambda k: f"{k + 1}. {_field(exercises[k], cols, '动作名称')}",
+        )
+        row = exercises[i]
+        name = _field(row, cols, "动作名称")
+        next_set = 1 + sum(1 for entry in logged if entry[4] == name)
+        reps, rpe = _number(row, cols, "次数"), _number(row, cols, "RPE下限")
+        if rpe is not None and not 1 <= rpe <= 10:
+            rpe = None
+        # 输入按训练日 + 动作名称区分，切换动作或训练日时换成该动作的目标值，不会沿用别处填的数；
+        # 组序的 key 再带上下一组的序号，记录后默认值跟着前进
+        slot = f"{day}/{name}"
+        keys = (f"log_set/{slot}/{next_set}", f"log_reps/{slot}", f"log_weight/{slot}", f"log_rpe/{slot}")
+        with st.form("log_form", border=False):
+            col_a, col_b = st.columns(2)
+            col_a.number_input("组序", min_value=1, value=next_set, step=1, key=keys[0])
+            col_b.number_input("次数", min_value=0, value=None if reps is None else int(reps), step=1, key=keys[1])
+            col_a, col_b = st.columns(2)
+            col_a.number_input("重量 kg", min_value=0.0, value=None, step=2.5, key=keys[2])
+            col_b.number_input("RPE", min_value=1.0, max_value=10.0, value=rpe, step=0.5, key=keys[3])
+            st.form_submit_button(
+                "记录这一组", type="primary", on_click=_submit_log, args=(spreadsheet_id, day, name, keys, tz),
+            )
+        if logged:
+            st.dataframe(
+                pd.DataFrame(
+                    [entry[4:9] + ("已同步" if entry[-1] else "待同步",) for entry in logged],
+                    columns=[*LOG_HEADER[4:9], "状态"],
+                ),
+                hide_index=True,
+            )
+        status = log_queue_status(spreadsheet_id)
+        if status["pending"]:
+            st.caption(
+                f"{status['pending']} 组待同步，约每 {LOG_FLUSH_INTERVAL} 秒批量写回一次"
+                + (f" · 上次写回失败：{status['error']}" if status["error"] else "")
+            )
+
 
-                # 显示练后拉伸
-                stretch_key = [d for d in day_names if "练后拉伸" in d]
-                if stretch_key:
-                    with st.expander("🧘 每日练后拉伸（点击展开）", expanded=False):
-                        render_mobile_day(stretch_key[0], day_data[stretch_key[0]], header)
+def view_weekly(gc, spreadsheet_id, is_mobile):
+    weekly = load_dataset(gc, "周训练计划", spreadsheet_id)
+    if weekly["frame"].empty:
+        st.info("无数据")
+        return
 
-                # 显示选中的训练日
-                if selected_day in day_data:
-                    render_mobile_day(selected_day, day_data[selected_day], header)
+    groups, cols = weekly["groups"], weekly["cols"]
+    day_names = list(groups.keys())
+    has_rpe = "RPE下限" in weekly["typed"].columns
 
-            else:
-                # 电脑端：表格视图 + 筛选器
-                df_weekly.iloc[:, 0] = df_weekly.iloc[:, 0].replace("", pd.NA).ffill().fillna("")
-                selected = st.multiselect(
-                    "筛选训练日",
-                    options=day_names,
-                    default=day_names,
-                    key="day_filter",
+    if is_mobile:
+        # 手机端：单日选择 + 卡片式展示
+        emit_html(
+            '<div style="font-size:14px;color:#666;text-align:center;margin-bottom:8px;">选择今天的训练日 👇</div>'
+        )
+
+        # 排除"每日通用热身"和"每日练后拉伸"，单独显示
+        training_days = [d for d in day_names if "热身" not in d and "练后拉伸" not in d]
+        selected_day = st.selectbox(
+            "训练日",
+            options=training_days,
+            index=0,
+            key="mobile_day",
+            label_visibility="collapsed",
+        )
+        high_only = has_rpe and st.toggle(HIGH_ONLY_LABEL, key="mobile_high_only")
+
+        # 先显示热身
+        warmup_key = [d for d in day_names if "热身" in d]
+        if warmup_key:
+            with st.expander("🔥 每日通用热身（点击展开）", expanded=False):
+                render_mobile_day(
+                    warmup_key[0], group_rows(weekly, warmup_key[0]), cols,
+                    cache_key=("周训练计划/day", True, groups[warmup_key[0]]["hash"], None),
                 )
-                df_filtered = df_weekly[df_weekly.iloc[:, 0].isin(selected)]
-                html = render_table_with_rowspan(df_filtered, merge_col=0)
-                st.markdown(html, unsafe_allow_html=True)
-                st.caption(f"共 {len(df_filtered)} 行 · {len(selected)} 个训练日")
-        else:
-            st.info("无数据")
 
-    # --- Tab 2: 动作库 ---
-    with tab2:
-        df_lib = load_sheet(gc, "动作库")
-        if not df_lib.empty:
-            if is_mobile:
-                if "动作类型" in df_lib.columns:
-                    types = df_lib["动作类型"].unique().tolist()
-                    selected_type = st.selectbox("筛选类型", ["全部"] + types, key="mobile_type")
-                    if selected_type != "全部":
-                        df_lib = df_lib[df_lib["动作类型"] == selected_type]
-                render_mobile_lib(df_lib)
-            else:
-                if "动作类型" in df_lib.columns:
-                    types = df_lib["动作类型"].unique().tolist()
-                    selected_types = st.multiselect(
-                        "按动作类型筛选", options=types, default=types, key="type_filter",
-                    )
-                    df_lib = df_lib[df_lib["动作类型"].isin(selected_types)]
-                html = render_simple_table(df_lib)
-                st.markdown(html, unsafe_allow_html=True)
-                st.caption(f"共 {len(df_lib)} 个动作")
-        else:
-            st.info("无数据")
+        # 显示练后拉伸
+        stretch_key = [d for d in day_names if "练后拉伸" in d]
+        if stretch_key:
+            with st.expander("🧘 每日练后拉伸（点击展开）", expanded=False):
+                render_mobile_day(
+                    stretch_key[0], group_rows(weekly, stretch_key[0]), cols,
+                    cache_key=("周训练计划/day", True, groups[stretch_key[0]]["hash"], None),
+                )
 
-    # --- Tab 3: 身体状况与禁忌 ---
-    with tab3:
-        df_body = load_sheet(gc, "身体状况与禁忌")
-        if not df_body.empty:
-            if is_mobile:
-                render_mobile_body(df_body)
-            else:
-                df_body.iloc[:, 0] = df_body.iloc[:, 0].replace("", pd.NA).ffill().fillna("")
-                html = render_table_with_rowspan(df_body, merge_col=0)
-                st.markdown(html, unsafe_allow_html=True)
+        # 显示选中的训练日
+        if selected_day in groups:
+            positions = groups[selected_day]["index"]
+            if high_only:
+                positions = high_intensity(weekly, positions)
+            render_mobile_day(
+                selected_day, [weekly["records"][i] for i in positions], cols,
+                cache_key=("周训练计划/day", True, groups[selected_day]["hash"], "high" if high_only else None),
+            )
+            if groups[selected_day]["totals"]:
+                st.caption(totals_caption(groups[selected_day]["totals"]))
+            if WORKOUT_LOG:
+                workout_log_form(spreadsheet_id, selected_day, group_rows(weekly, selected_day), cols)
+        return
+
+    high_only = has_rpe and st.toggle(HIGH_ONLY_LABEL, key="high_only")
+    if CLIENT_FILTERS and not high_only:
+        # 电脑端：整张表随组件下发，筛选训练日在浏览器里完成（服务端路径同样要发整张表，且不分页，所以不按行数退回）
+        payload = cached_html(
+            ("周训练计划", False, weekly["hash"], "client"), lambda: weekly_filter_payload(weekly),
+        )
+        render_client_filter(payload, weekly["hash"], key="day_filter_client")
+    else:
+        # 电脑端：表格视图 + 筛选器（只看高强度时逐行筛选，在服务端完成）
+        selected = st.multiselect(
+            "筛选训练日",
+            options=day_names,
+            default=day_names,
+            key="day_filter",
+        )
+        if high_only:
+            positions = high_intensity(weekly, [i for day in groups if day in selected for i in groups[day]["index"]])
+            html = cached_html(
+                ("周训练计划", False, weekly["hash"], ("high", _filter_key(selected))),
+                lambda: render_table_with_rowspan(weekly["frame"].iloc[positions], 0, weekly["typed"]),
+            )
+            n_rows = len(positions)
         else:
-            st.info("无数据")
-
-    # --- Tab 4: 备注与说明 ---
-    with tab4:
-        df_notes = load_sheet(gc, "备注与说明")
-        if not df_notes.empty:
-            for _, row in df_notes.iterrows():
-                topic = str(row.iloc[0]).strip()
-                content = str(row.iloc[1]).strip()
-                if topic == "" and content == "":
-                    st.markdown("---")
-                elif content == "":
-                    st.subheader(topic)
-                else:
-                    if is_mobile:
-                        st.markdown(
-                            f'<div style="margin-bottom:8px;"><span style="font-weight:700;font-size:14px;">{topic}</span><br><span style="font-size:13px;color:#444;">{content}</span></div>',
-                            unsafe_allow_html=True,
-                        )
-                    else:
-                        st.markdown(f"**{topic}**：{content}")
+            html = cached_html(
+                ("周训练计划", False, weekly["hash"], _filter_key(selected)),
+                lambda: render_weekly_table(weekly, selected),
+            )
+            n_rows = sum(len(groups[day]["index"]) for day in groups if day in selected)
+        emit_html(html)
+        st.caption(f"共 {n_rows} 行 · {len(selected)} 个训练日")
+
+    totals = [{"训练日": day, **group["totals"]} for day, group in groups.items() if group["totals"]]
+    if totals:
+        with st.expander("📊 每日训练量"):
+            st.dataframe(pd.DataFrame(totals), hide_index=True)
+
+
+def view_library(gc, spreadsheet_id, is_mobile):
+    lib = load_dataset(gc, "动作库", spreadsheet_id)
+    df_all, lib_hash = lib["frame"], lib["hash"]
+    if df_all.empty:
+        st.info("无数据")
+        return
+
+    query = search_box("lib_search", "🔍 搜索动作名称、目标肌群、注意事项")
+    df_lib, rows = search_dataset(spreadsheet_id, lib, "动作库", query)
+
+    if is_mobile:
+        selected_type = "全部"
+        if "动作类型" in df_lib.columns:
+            types = df_all["动作类型"].unique().tolist()
+            selected_type = st.selectbox("筛选类型", ["全部"] + types, key="mobile_type")
+            if selected_type != "全部":
+                rows = _select_rows(rows, df_lib["动作类型"] == selected_type)
+        start, stop = paginate(len(rows), "mobile_lib_page", reset_on=(query, selected_type))
+        render_mobile_lib(
+            rows[start:stop], lib["cols"], cache_key=("动作库", True, lib_hash, (query, selected_type, start)),
+        )
+        st.caption(page_caption(f"共 {len(rows)} 个动作", len(rows), start, stop))
+    elif use_client_filter(len(df_all)):
+        payload = cached_html(
+            ("动作库", False, lib_hash, ("client", query)),
+            lambda: table_filter_payload(df_lib, [("动作类型", "按动作类型筛选")], "共 {rows} 个动作", df_all),
+        )
+        render_client_filter(payload, lib_hash + query, key="type_filter_client")
+    else:
+        selected_types = None
+        if "动作类型" in df_lib.columns:
+            types = df_all["动作类型"].unique().tolist()
+            selected_types = st.multiselect(
+                "按动作类型筛选", options=types, default=types, key="type_filter",
+            )
+            df_lib = df_lib[df_lib["动作类型"].isin(selected_types)]
+        filter_key = (query, None if selected_types is None else _filter_key(selected_types))
+        start, stop = paginate(len(df_lib), "lib_page", reset_on=filter_key)
+        html = cached_html(
+            ("动作库", False, lib_hash, (filter_key, start)),
+            lambda: render_simple_table(df_lib.iloc[start:stop]),
+        )
+        emit_html(html)
+        st.caption(page_caption(f"共 {len(df_lib)} 个动作", len(df_lib), start, stop))
+
+
+def view_body(gc, spreadsheet_id, is_mobile):
+    body = load_dataset(gc, "身体状况与禁忌", spreadsheet_id)
+    if body["frame"].empty:
+        st.info("无数据")
+        return
+
+    body_key = ("身体状况与禁忌", is_mobile, body["hash"], None)
+    if is_mobile:
+        render_mobile_body(body["records"], cache_key=body_key)
+    else:
+        html = cached_html(body_key, lambda: render_table_with_rowspan(body["frame"], merge_col=0))
+        emit_html(html)
+
+
+def view_notes(gc, spreadsheet_id, is_mobile):
+    notes = load_dataset(gc, "备注与说明", spreadsheet_id)
+    if notes["frame"].empty:
+        st.info("无数据")
+        return
+
+    for row in notes["records"]:
+        topic = str(row[0]).strip()
+        content = str(row[1]).strip()
+        if topic == "" and content == "":
+            emit_html("---")
+        elif content == "":
+            st.subheader(topic)
         else:
-            st.info("无数据")
-
-    # --- Tab 5: 训练笔记 ---
-    with tab5:
-        df_tnotes = load_sheet(gc, "训练笔记")
-        if not df_tnotes.empty:
             if is_mobile:
-                # 筛选器
-                priorities = df_tnotes["优先级"].unique().tolist() if "优先级" in df_tnotes.columns else []
-                sel_pri = st.selectbox("按优先级筛选", ["全部"] + priorities, key="note_pri")
-                if sel_pri != "全部":
-                    df_tnotes = df_tnotes[df_tnotes["优先级"] == sel_pri]
-                render_mobile_notes(df_tnotes)
+                emit_html(
+                    f'<div {_css(STYLES["topic-row"])}><span {_css(STYLES["topic"])}>{topic}</span><br><span {_css(STYLES["topic-content"])}>{content}</span></div>'
+                )
             else:
-                # 电脑端：筛选 + 表格
-                col_a, col_b = st.columns(2)
-                with col_a:
-                    priorities = df_tnotes["优先级"].unique().tolist() if "优先级" in df_tnotes.columns else []
-                    sel_pri = st.multiselect("按优先级筛选", priorities, default=priorities, key="note_pri_d")
-                with col_b:
-                    statuses = df_tnotes["状态"].unique().tolist() if "状态" in df_tnotes.columns else []
-                    sel_sta = st.multiselect("按状态筛选", statuses, default=statuses, key="note_sta_d")
-                df_tnotes = df_tnotes[
-                    df_tnotes["优先级"].isin(sel_pri) & df_tnotes["状态"].isin(sel_sta)
-                ]
-                html = render_simple_table(df_tnotes)
-                st.markdown(html, unsafe_allow_html=True)
-                st.caption(f"共 {len(df_tnotes)} 条训练笔记")
+                emit_html(f"**{topic}**：{content}")
+
+
+def view_training_notes(gc, spreadsheet_id, is_mobile):
+    tnotes = load_dataset(gc, "训练笔记", spreadsheet_id)
+    df_all, tnotes_hash = tnotes["frame"], tnotes["hash"]
+    if df_all.empty:
+        st.info("无训练笔记")
+        return
+
+    query = search_box("note_search", "🔍 搜索动作名称、问题发现、修正建议")
+    df_tnotes, rows = search_dataset(spreadsheet_id, tnotes, "训练笔记", query)
+
+    if is_mobile:
+        # 筛选器
+        priorities = df_all["优先级"].unique().tolist() if "优先级" in df_all.columns else []
+        sel_pri = st.selectbox("按优先级筛选", ["全部"] + priorities, key="note_pri")
+        if sel_pri != "全部":
+            rows = _select_rows(rows, df_tnotes["优先级"] == sel_pri)
+        start, stop = paginate(len(rows), "note_page", reset_on=(query, sel_pri))
+        render_mobile_notes(
+            rows[start:stop], tnotes["cols"], cache_key=("训练笔记", True, tnotes_hash, (query, sel_pri, start)),
+        )
+        st.caption(page_caption(f"共 {len(rows)} 条训练笔记", len(rows), start, stop))
+    elif use_client_filter(len(df_all)):
+        payload = cached_html(
+            ("训练笔记", False, tnotes_hash, ("client", query)),
+            lambda: table_filter_payload(
+                df_tnotes, [("优先级", "按优先级筛选"), ("状态", "按状态筛选")], "共 {rows} 条训练笔记", df_all,
+            ),
+        )
+        render_client_filter(payload, tnotes_hash + query, key="note_filter_client")
+    else:
+        # 电脑端：筛选 + 表格
+        col_a, col_b = st.columns(2)
+        with col_a:
+            priorities = df_all["优先级"].unique().tolist() if "优先级" in df_all.columns else []
+            sel_pri = st.multiselect("按优先级筛选", priorities, default=priorities, key="note_pri_d")
+        with col_b:
+            statuses = df_all["状态"].unique().tolist() if "状态" in df_all.columns else []
+            sel_sta = st.multiselect("按状态筛选", statuses, default=statuses, key="note_sta_d")
+        df_tnotes = df_tnotes[
+            df_tnotes["优先级"].isin(sel_pri) & df_tnotes["状态"].isin(sel_sta)
+        ]
+        filter_key = (query, _filter_key(sel_pri), _filter_key(sel_sta))
+        start, stop = paginate(len(df_tnotes), "note_page_d", reset_on=filter_key)
+        html = cached_html(
+            ("训练笔记", False, tnotes_hash, (filter_key, start)),
+            lambda: render_simple_table(df_tnotes.iloc[start:stop]),
+        )
+        emit_html(html)
+        st.caption(page_caption(f"共 {len(df_tnotes)} 条训练笔记", len(df_tnotes), start, stop))
+
+
+def view_progress(gc, spreadsheet_id, is_mobile):
+    """只读物化好的汇总；进入页面时先把新增的记录、变化的训练笔记并进去（没有新数据时各是一次查询）"""
+    fetched_at = ensure_snapshot(gc, spreadsheet_id)
+    tnotes = _snapshot_dataset(spreadsheet_id, "训练笔记", fetched_at)
+    track_note_status(spreadsheet_id, tnotes["frame"], tnotes["hash"], fetched_at)
+    update_log_rollups(spreadsheet_id, _sheets_fetcher(gc))
+
+    st.subheader("🏋️ 训练记录趋势")
+    exercises = progress_exercises(spreadsheet_id)
+    if not exercises:
+        st.info("还没有训练记录：在手机版训练日下方的「✍️ 记录训练」里逐组记录")
+    else:
+        exercise = st.selectbox("动作", exercises, key="progress_exercise")
+        period = st.radio(
+            "汇总", list(PROGRESS_PERIODS), format_func=PROGRESS_PERIODS.get, horizontal=True,
+            key="progress_period", label_visibility="collapsed",
+        )
+        trend = progress_trend(spreadsheet_id, exercise, period)
+        chart = trend.set_index(trend.columns[0])
+        if is_mobile:
+            st.line_chart(chart[["训练量 kg"]], height=220)
+        else:
+            col_a, col_b = st.columns(2)
+            with col_a:
+                st.line_chart(chart[["训练量 kg"]], height=260)
+            with col_b:
+                st.line_chart(chart[["最大重量 kg", "平均 RPE"]], height=260)
+        st.dataframe(trend.iloc[::-1], hide_index=True)
+
+    st.subheader("🔬 问题修正用时")
+    durations = note_durations(spreadsheet_id)
+    if durations.empty:
+        st.info(f"训练笔记里还没有处于「{NOTE_OBSERVING}」或已从观察中变为「{NOTE_RESOLVED}」的问题")
+    else:
+        st.dataframe(durations, hide_index=True)
+    st.caption(
+        f"从笔记日期（或第一次看到「{NOTE_OBSERVING}」）算到第一次看到「{NOTE_RESOLVED}」的快照，"
+        f"快照约每 {CACHE_TTL // 60} 分钟刷新一次"
+    )
+
+
+VIEWS = {
+    "📅 训练计划": view_weekly,
+    "📚 动作库": view_library,
+    "🏥 身体状况": view_body,
+    "📝 备注": view_notes,
+    "🔬 训练笔记": view_training_notes,
+    "📈 进度": view_progress,
+}
+
+
+def _view_fragment(view, gc, spreadsheet_id, is_mobile):
+    """fragment 主体；视图内交互只重跑 fragment 时，自成一次运行并输出埋点"""
+    fragment_rerun = not _RUN["page"]
+    if fragment_rerun:
+        _begin_run(page=False)
+    with stage_timer(f"view/{view.__name__}"):
+        view(gc, spreadsheet_id, is_mobile)
+    if _RUN["page"] and _RUN["first_view"] is None:
+        _RUN["first_view"] = time.perf_counter() - _RUN["started"]
+    if fragment_rerun:
+        _end_run("fragment")
+
+
+def render_debug_panel(spreadsheet_id: str):
+    """侧边栏显示本次整页运行的分阶段明细（fragment 单独重跑时侧边栏不会更新）"""
+    html_cache = _html_cache()
+    with st.sidebar:
+        st.subheader("⏱ 性能埋点")
+        st.caption(
+            f"本次运行 {(time.perf_counter() - _RUN['started']) * 1000:.0f} ms · "
+            f"HTML 缓存 {len(html_cache)} 项 / {html_cache.nbytes / 1e6:.1f} MB · "
+            f"命中 {html_cache.hits} / 未命中 {html_cache.misses}"
+        )
+        dataset_cache = _dataset_cache()
+        st.caption(
+            f"数据集缓存 {len(dataset_cache)} 项（工作表 + 搜索索引） / {dataset_cache.nbytes / 1e6:.1f} MB"
+            f"（上限 {dataset_cache.max_bytes / 1e6:.0f} MB） · 计划 {len(_plan_states())} 份"
+        )
+        client = _get_client()
+        fetcher = _sheets_fetcher(client)
+        refresh = _refresh_state(spreadsheet_id)
+        last_success = refresh["last_success"]
+        st.caption(
+            f"后台刷新：成功 {refresh['refreshes']} 次 / 失败 {refresh['failures']} 次"
+            f"（连续 {refresh['consecutive_failures']}） · 上次预取延迟 {refresh['lag']:.1f} 秒"
+            + ("" if last_success is None else
+               f" · 上次成功于 {time.time() - last_success:.0f} 秒前，耗时 {refresh['last_duration']:.2f} 秒")
+        )
+        st.caption(
+            f"Sheets 客户端{'已创建' if client.ready else '未创建（本进程还没有访问过 Google）'} · "
+            f"配额：近 60 秒读 {fetcher.quota_used()} / {fetcher.quota_per_minute} 次、"
+            f"写 {fetcher.quota_used('write')} / {fetcher.write_quota_per_minute} 次 · "
+            + " · ".join(f"{k} {v}" for k, v in fetcher.stats_snapshot().items())
+        )
+        if WORKOUT_LOG:
+            writer = _log_scheduler(client)["writer"]
+            st.caption(
+                f"训练记录写回：本计划待同步 {log_queue_status(spreadsheet_id)['pending']} 组 · "
+                + " · ".join(f"{k} {v}" for k, v in writer.stats_snapshot().items())
+            )
+        st.dataframe(
+            pd.DataFrame(run_summary(), columns=["阶段", "次数", "毫秒", "字节", "元素"]),
+            hide_index=True,
+        )
+        with st.expander("数据集内存（本计划）"):
+            st.dataframe(
+                pd.DataFrame(
+                    dataset_memory_report(spreadsheet_id), columns=["工作表", "行数", "表格 KB", "解析列 KB", "记录 KB", "索引 KB", "category 列"],
+                ),
+                hide_index=True,
+            )
+        with st.expander("进程累计计数器"):
+            st.code(_stage_counters().prometheus_text(), language="text")
+
+
+# ============================================================
+# 设备模式：在任何渲染之前确定，新会话只跑一次脚本
+# ============================================================
+DEVICE_MODES = ("mobile", "desktop")
+
+
+def resolve_device_mode() -> bool:
+    """?device= 参数 > 本会话已确定的值 > User-Agent 判断；结果写回 URL，刷新页面后保持不变"""
+    mode = st.query_params.get("device")
+    if mode not in DEVICE_MODES:
+        mode = st.session_state.get("device_mode")
+    if mode not in DEVICE_MODES:
+        user_agent = st.context.headers.get("User-Agent") or ""
+        mode = "mobile" if MOBILE_UA.search(user_agent) else "desktop"
+    st.session_state["device_mode"] = mode
+    if st.query_params.get("device") != mode:
+        st.query_params["device"] = mode
+    return mode == "mobile"
+
+
+def _switch_device(mode: str):
+    st.session_state["device_mode"] = mode
+    st.query_params["device"] = mode
+
+
+# ============================================================
+# 训练计划：每个会话选一份（PLANS），所有计划共用客户端和缓存
+# ============================================================
+def resolve_plan() -> str:
+    """?plan= 参数 > 本会话已选的计划 > 第一份；返回计划名称"""
+    name = st.query_params.get("plan")
+    if name not in PLANS:
+        name = st.session_state.get("plan")
+    if name not in PLANS:
+        name = next(iter(PLANS))
+    st.session_state["plan"] = name
+    if len(PLANS) > 1 and st.query_params.get("plan") != name:
+        st.query_params["plan"] = name
+    return name
+
+
+def _switch_plan():
+    name = st.session_state["plan_select"]
+    st.session_state["plan"] = name
+    st.query_params["plan"] = name
+
+
+# ============================================================
+# 主应用
+# ============================================================
+def main():
+    _begin_run(page=True)
+    plan = resolve_plan()
+    spreadsheet_id = PLANS[plan]
+    st.set_page_config(page_title=f"{plan}训练计划", page_icon="💪", layout="wide")
+    emit_html(page_css())
+
+    is_mobile = resolve_device_mode()
+
+    if is_mobile:
+        emit_html(
+            f'<div style="text-align:center;padding:8px 0;"><span style="font-size:22px;font-weight:800;">💪 {plan}训练计划</span></div>'
+        )
+    else:
+        st.title(f"💪 {plan}训练计划")
+
+    if len(PLANS) > 1:
+        st.selectbox(
+            "训练计划", list(PLANS), index=list(PLANS).index(plan), key="plan_select", on_change=_switch_plan,
+        )
+
+    try:
+        gc = _get_client()  # 只是占位，本地有快照时这次运行不会导入 gspread、也不会连接 Google
+        # 只有本地没有快照（新容器首次访问）时才会同步拉取，期间显示提示
+        with st.spinner("首次加载，正在从 Google Sheet 拉取数据…"):
+            fetched_at = ensure_snapshot(gc, spreadsheet_id)
+        st.caption(snapshot_caption(fetched_at, spreadsheet_id))
+        if PREFETCH:
+            _prefetch_scheduler(gc)
+        if WORKOUT_LOG:
+            _log_scheduler(gc)
+
+        if LAZY_TABS:
+            # 只运行当前视图；视图内的筛选器只重跑该 fragment
+            view_name = st.radio(
+                "视图", list(VIEWS), horizontal=True, key="view", label_visibility="collapsed",
+            )
+            st.fragment(_view_fragment)(VIEWS[view_name], gc, spreadsheet_id, is_mobile)
         else:
-            st.info("无训练笔记")
+            for tab, view in zip(st.tabs(list(VIEWS)), VIEWS.values()):
+                with tab:
+                    st.fragment(_view_fragment)(view, gc, spreadsheet_id, is_mobile)
+
+    except Exception as e:
+        st.error(f"连接失败：{e}")
+        st.info("请检查 Streamlit Secrets 中的 Google Sheet 凭证配置。")
+
+    # 识别有误（如平板）时手动切换；回调在 rerun 之前执行，不会多跑一次
+    st.button(
+        "切换到电脑版" if is_mobile else "切换到手机版",
+        key="switch_device",
+        on_click=_switch_device,
+        args=("desktop" if is_mobile else "mobile",),
+    )
+
+    if METRICS and (DEBUG_PANEL or st.query_params.get("debug") == "1"):
+        render_debug_panel(spreadsheet_id)
+    _end_run("page")
+
 
-except Exception as e:
-    st.error(f"连接失败：{e}")
-    st.info("请检查 Streamlit Secrets 中的 Google Sheet 凭证配置。")
+if __name__ == "__main__":
+    main()